@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cc.settings')
+# Sync views run on executor threads under ASGI, so per-thread persistent
+# connections would pile up; share a bounded pool instead (PostgreSQL only).
+os.environ.setdefault('CC_DB_POOL_SIZE', '10')
 
 application = get_asgi_application()
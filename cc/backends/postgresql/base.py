@@ -0,0 +1,79 @@
+"""
+PostgreSQL backend with connection health checks and optional pooling.
+
+Extra settings understood on top of django.db.backends.postgresql:
+
+    'CONN_HEALTH_CHECKS': True     ping a persistent connection once per
+                                   request before reusing it
+    OPTIONS['pool']: {'min_size': 1, 'max_size': 10}
+                                   keep connections in a process-wide
+                                   psycopg2 ThreadedConnectionPool; close()
+                                   hands the connection back instead of
+                                   disconnecting (used by the ASGI entry
+                                   point, where requests hop threads)
+"""
+
+import threading
+
+import psycopg2.extras
+import psycopg2.pool
+from django.db.backends.postgresql import base
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+
+    def get_connection_params(self):
+        self.pool_options = self.settings_dict['OPTIONS'].get('pool')
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_pool(self, conn_params):
+        with pools_lock:
+            pool = pools.get(self.alias)
+            if pool is None:
+                pool = pools[self.alias] = psycopg2.pool.ThreadedConnectionPool(
+                    self.pool_options.get('min_size', 1),
+                    self.pool_options.get('max_size', 10),
+                    **conn_params,
+                )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        if not self.pool_options:
+            return super().get_new_connection(conn_params)
+        connection = self.get_pool(conn_params).getconn()
+        # Same session setup as the stock backend performs after connect().
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is not None and self.pool_options:
+            with self.wrap_database_errors:
+                pools[self.alias].putconn(self.connection, close=bool(self.connection.closed))
+            return
+        super()._close()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if (self.connection is None or self.health_check_done or
+                not self.settings_dict.get('CONN_HEALTH_CHECKS')):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
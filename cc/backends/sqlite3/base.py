@@ -0,0 +1,38 @@
+"""
+SQLite backend tuned for many concurrent writers.
+
+Extra OPTIONS understood on top of django.db.backends.sqlite3:
+
+    'pragmas': {'journal_mode': 'WAL', ...}  applied on every new connection
+    'transaction_mode': 'IMMEDIATE'          BEGIN mode for atomic() blocks
+
+BEGIN IMMEDIATE takes the write lock when the transaction starts, so a
+writer waits on the busy timeout ('timeout' option) instead of failing with
+"database is locked" when it upgrades a read lock halfway through.
+"""
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = options.get('pragmas', {})
+        self.transaction_mode = options.get('transaction_mode', 'DEFERRED').upper()
+        if self.transaction_mode not in self.TRANSACTION_MODES:
+            raise ValueError(f'Unsupported SQLite transaction_mode: {self.transaction_mode}')
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,149 @@
+"""
+Media file serving for cc project.
+
+Serves files under MEDIA_ROOT with validators (ETag / Last-Modified),
+single byte-range support and long cache headers.  The body is handed to
+the WSGI server as a file object so ``wsgi.file_wrapper`` can use
+sendfile().  With MEDIA_SERVE_MODE set to 'x-accel-redirect' (nginx) or
+'x-sendfile' (apache / lighttpd) only the headers are produced here and
+the front-end server sends the bytes.
+"""
+
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """Read-only view of ``length`` bytes of ``fileobj`` starting at ``start``."""
+
+    def __init__(self, fileobj, start, length):
+        self.fileobj = fileobj
+        self.remaining = length
+        fileobj.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def media_etag(stat):
+    return '"{:x}-{:x}"'.format(int(stat.st_mtime), stat.st_size)
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single ``bytes=`` range, None when the header
+    should be ignored, or False when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, min(end, size - 1)
+
+
+def if_range_passes(request, etag, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def serve_media(request, path):
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    except Exception:
+        raise Http404('檔案不存在')
+    if not fullpath.is_file():
+        raise Http404('檔案不存在')
+
+    stat = fullpath.stat()
+    etag = media_etag(stat)
+    content_type = mimetypes.guess_type(str(fullpath))[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = build_response(request, fullpath, path, stat, etag, content_type)
+    if response.status_code in (200, 206, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
+
+
+def build_response(request, fullpath, path, stat, etag, content_type):
+    mode = getattr(settings, 'MEDIA_SERVE_MODE', 'django')
+    if mode == 'x-accel-redirect':
+        # nginx handles Range and sendfile on the internal location itself.
+        # Header values must be ASCII; both servers URL-decode the path.
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_PREFIX + path)
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = quote(str(fullpath))
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    if request.META.get('HTTP_RANGE') and if_range_passes(request, etag, stat.st_mtime):
+        byte_range = parse_range(request.META['HTTP_RANGE'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{}'.format(size)
+        return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = size
+    elif byte_range is None:
+        response = FileResponse(fullpath.open('rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(
+            RangeFile(fullpath.open('rb'), start, length),
+            status=206, content_type=content_type,
+        )
+        response['Content-Length'] = length
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def media_urlpatterns():
+    prefix = re.escape(settings.MEDIA_URL.lstrip('/'))
+    return [re_path(r'^%s(?P<path>.*)$' % prefix, serve_media)]
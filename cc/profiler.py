@@ -0,0 +1,153 @@
+"""
+Opt-in request profiler for staff.
+
+Add ``?_profile=1`` (or the ``X-Profile: 1`` header) to any URL while
+logged in as staff. The request runs under cProfile with every SQL query
+and template render timed; the report is kept in memory (the last
+PROFILER_HISTORY requests, browsable at /profiles/) and the response
+carries an ``X-Profile-Url`` header. ``?_profile=show`` returns the report
+instead of the page. Requests without the flag only pay for a
+query-string lookup.
+"""
+
+import cProfile
+import io
+import itertools
+import pstats
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import Http404
+from django.shortcuts import render
+from django.template import base as template_base
+from django.urls import path, reverse
+
+QUERY_PARAM = '_profile'
+HEADER = 'HTTP_X_PROFILE'
+
+reports = deque(maxlen=getattr(settings, 'PROFILER_HISTORY', 20))
+report_ids = itertools.count(1)
+current = ContextVar('cc_profile', default=None)
+hook_lock = threading.Lock()
+hook_installed = False
+
+
+def install_template_hook():
+    """Wrap Template.render once, on the first profiled request."""
+    global hook_installed
+    with hook_lock:
+        if hook_installed:
+            return
+        original = template_base.Template.render
+
+        def render(self, context):
+            report = current.get()
+            if report is None:
+                return original(self, context)
+            start = time.perf_counter()
+            try:
+                return original(self, context)
+            finally:
+                report['templates'].append((self.origin.template_name or str(self.origin), (time.perf_counter() - start) * 1000))
+
+        template_base.Template.render = render
+        hook_installed = True
+
+
+class SQLRecorder:
+    def __init__(self, alias, report):
+        self.alias = alias
+        self.report = report
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.report['queries'].append((self.alias, sql, (time.perf_counter() - start) * 1000))
+
+
+class ProfilerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.GET.get(QUERY_PARAM) or request.META.get(HEADER)
+        if not mode or not getattr(request, 'user', None) or not request.user.is_staff:
+            return self.get_response(request)
+
+        install_template_hook()
+        report = {
+            'id': next(report_ids),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': request.user.get_username(),
+            'started': time.time(),
+            'queries': [],
+            'templates': [],
+        }
+        token = current.set(report)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(SQLRecorder(conn.alias, report)))
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            current.reset(token)
+        report['duration'] = (time.perf_counter() - start) * 1000
+        report['status'] = response.status_code
+        self.summarize(report, profiler)
+        reports.append(report)
+
+        if mode == 'show':
+            return render(request, 'profiler/detail.html', {'report': report})
+        response['X-Profile-Url'] = reverse('profile_detail', args=[report['id']])
+        return response
+
+    def summarize(self, report, profiler):
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out).strip_dirs().sort_stats('cumulative')
+        stats.print_stats(40)
+        report['top_functions'] = out.getvalue()
+        out = io.StringIO()
+        stats.stream = out
+        stats.print_callees(15)
+        report['call_tree'] = out.getvalue()
+
+        report['sql_time'] = sum(q[2] for q in report['queries'])
+        counts = Counter(q[1] for q in report['queries'])
+        report['duplicates'] = sorted(((n, sql) for sql, n in counts.items() if n > 1), reverse=True)
+        report['template_time'] = sum(t[1] for t in report['templates'])
+
+
+@staff_member_required
+def profile_list(request):
+    return render(request, 'profiler/list.html', {'reports': list(reversed(reports))})
+
+
+@staff_member_required
+def profile_detail(request, pid):
+    # Other threads append to the deque; iterating it directly can raise
+    # "deque mutated during iteration".
+    for report in list(reports):
+        if report['id'] == pid:
+            return render(request, 'profiler/detail.html', {'report': report})
+    raise Http404('找不到這筆分析紀錄')
+
+
+urlpatterns = [
+    path('', profile_list, name='profile_list'),
+    path('<int:pid>/', profile_detail, name='profile_detail'),
+]
@@ -0,0 +1,68 @@
+"""
+Read-replica routing for cc project.
+
+Reads go to one of settings.DATABASE_REPLICAS unless the current request
+is pinned to the primary: unsafe methods, anything after a write in the
+same request, and requests carrying the pin cookie that
+ReplicaPinMiddleware sets for REPLICA_PIN_SECONDS after a write
+(read-your-writes while the replicas catch up). Authentication, sessions
+and admin data always stay on the primary.
+"""
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'cc_db_pin'
+PRIMARY_APPS = {'auth', 'sessions', 'admin', 'contenttypes'}
+
+# A mutable dict rather than a plain flag so a write inside a view is seen by
+# the middleware even when the view ran in a copied context (ASGI).
+request_state = ContextVar('cc_db_state', default=None)
+
+
+def pin_to_primary():
+    state = request_state.get()
+    if state is not None:
+        state['pinned'] = state['wrote'] = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        state = request_state.get()
+        if state is None or state['pinned']:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_APPS:
+            pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS') or PIN_COOKIE in request.COOKIES
+        state = {'pinned': pinned, 'wrote': False}
+        token = request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_state.reset(token)
+        if state['wrote'] and getattr(settings, 'DATABASE_REPLICAS', []):
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,10 +43,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'cc.routers.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'cc.profiler.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,19 +81,76 @@ WSGI_APPLICATION = 'cc.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'cc.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -20000,
+                'temp_store': 'MEMORY',
+            },
+        },
+        # A file-backed test database so tests see the same locking as
+        # production (the in-memory default uses shared-cache table locks).
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
-    # 'default': {
-    #     'ENGINE': 'django.db.backends.postgresql_psycopg2',
-    #     'NAME': 'cc_new', 
-    #     'USER': 'cc', 
-    #     'PASSWORD': 'Password',
-    #     'HOST': 'localhost',
-    #     'PORT': '',
-    # },
 }
 
+# PostgreSQL production profile, selected with CC_DB_ENGINE=postgresql
+# (requires psycopg2). Copy an existing SQLite database across with
+# `manage.py sqlite_to_postgres`.
+if os.environ.get('CC_DB_ENGINE') == 'postgresql':
+    DATABASES['default'] = {
+        'ENGINE': 'cc.backends.postgresql',
+        'NAME': os.environ.get('CC_DB_NAME', 'cc'),
+        'USER': os.environ.get('CC_DB_USER', 'cc'),
+        'PASSWORD': os.environ.get('CC_DB_PASSWORD', ''),
+        'HOST': os.environ.get('CC_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('CC_DB_PORT', ''),
+        # Persistent connections, verified once per request before reuse.
+        'CONN_MAX_AGE': int(os.environ.get('CC_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        # Set when running behind pgbouncer in transaction pooling mode.
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('CC_DB_DISABLE_SERVER_SIDE_CURSORS') == '1',
+        'OPTIONS': {
+            'connect_timeout': 5,
+        },
+    }
+    if os.environ.get('CC_DB_POOL_SIZE'):
+        # Client-side pool (enabled by cc/asgi.py): connections are returned
+        # to the pool at the end of each request instead of being kept per
+        # thread.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': 1,
+            'max_size': int(os.environ['CC_DB_POOL_SIZE']),
+        }
+
+
+# Read replicas: CC_DB_REPLICAS is a comma separated list of SQLite files
+# (e.g. a litestream / rsync copy of db.sqlite3) or, for PostgreSQL, standby
+# host names. Browsing reads are spread over them by cc.routers.
+DATABASE_REPLICAS = []
+for n, replica in enumerate(filter(None, os.environ.get('CC_DB_REPLICAS', '').split(',')), 1):
+    alias = f'replica{n}'
+    DATABASES[alias] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if DATABASES['default']['ENGINE'] == 'cc.backends.sqlite3':
+        DATABASES[alias]['NAME'] = replica
+    else:
+        DATABASES[alias]['HOST'] = replica
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['cc.routers.ReplicaRouter']
+
+# How long a client keeps reading from the primary after it wrote something.
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -136,10 +196,48 @@ MEDIA_ROOT = BASE_DIR / 'upload'
 
 MEDIA_URL = '/upload/'
 
+# How uploaded media is delivered: 'django' streams the file from this
+# process, 'x-accel-redirect' (nginx) and 'x-sendfile' (apache) hand the
+# transfer off to the front-end server.
+MEDIA_SERVE_MODE = 'django'
+
+# nginx `internal` location aliased to MEDIA_ROOT, used by x-accel-redirect.
+MEDIA_ACCEL_PREFIX = '/protected-upload/'
+
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 30
+
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# collectstatic writes content-hashed copies plus staticfiles.json; run
+# `manage.py optimize_static` afterwards to prune unused assets and write
+# .gz / .br siblings for the front-end server (gzip_static / brotli_static).
+STATICFILES_STORAGE = 'cc.storage.FingerprintedStaticFilesStorage'
+
+# Number of ?_profile=1 reports kept in memory per process (see cc.profiler).
+PROFILER_HISTORY = 20
+
+EMAIL_BACKEND = os.environ.get('CC_EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.environ.get('CC_EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('CC_EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('CC_EMAIL_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('CC_EMAIL_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('CC_EMAIL_USE_TLS') == '1'
+EMAIL_TIMEOUT = 30
+DEFAULT_FROM_EMAIL = os.environ.get('CC_EMAIL_FROM', 'webmaster@localhost')
+
+# Overdue-loan reminders (manage.py send_loan_reminders, run daily from
+# cron). A loan is overdue after LOAN_REMINDER_DAYS days unless its model
+# category (Model.CATEGORY_CHOICES) or, failing that, the borrower's role
+# (Applicant.ROLE_CHOICES) has its own threshold. Each day's run replaces
+# the previous day's unsent digests, so LOAN_REMINDER_MAX_ATTEMPTS limits
+# retries of one day's digest when the command is re-run that day.
+LOAN_REMINDER_DAYS = 90
+LOAN_REMINDER_DAYS_BY_CATEGORY = {}
+LOAN_REMINDER_DAYS_BY_ROLE = {}
+LOAN_REMINDER_MAX_ATTEMPTS = 5
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'homepage'
 LOGOUT_REDIRECT_URL = 'homepage'
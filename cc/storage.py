@@ -0,0 +1,16 @@
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+class FingerprintedStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed static file names from the collectstatic manifest.
+
+    Until collectstatic has written a manifest (development checkouts, test
+    runs) the plain names are used instead of failing the page render.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
@@ -16,12 +16,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
-from django.conf import settings
-from django.conf.urls.static import static
+from cc.media import media_urlpatterns
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('em/', include('em.urls')),
     path('', TemplateView.as_view(template_name='homepage.html'), name='homepage'),
     path('user/', include('django.contrib.auth.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('profiles/', include('cc.profiler')),
+] + media_urlpatterns()
@@ -1,9 +1,190 @@
+import operator
+from functools import reduce
+
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.utils import lookup_needs_distinct
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import CharField, Q
+from django.db.models.functions import Upper
+from django.utils.functional import cached_property
+from django.utils.text import smart_split, unescape_string_literal
 from .models import *
 
-# Register your models here.
-admin.site.register(Model)
-admin.site.register(Equip)
-admin.site.register(Applicant)
-admin.site.register(Log)
-admin.site.register(Inventory)
\ No newline at end of file
+CharField.register_lookup(Upper)
+
+# Below this many rows an exact COUNT(*) is cheap enough.
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimated_count(queryset):
+    """
+    Planner statistics row estimate for an unfiltered table, or None.
+
+    PostgreSQL keeps it in pg_class.reltuples; SQLite has it in
+    sqlite_stat1 once ANALYZE has run (see the sqlite_maintenance command).
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+    elif connection.vendor == 'sqlite':
+        # The first number of each stat row is the rows in that index; partial
+        # indexes (e.g. open loans only) cover just part of the table.
+        sql = (
+            'SELECT MAX(CAST(s.stat AS INTEGER)) FROM sqlite_stat1 s '
+            "LEFT JOIN sqlite_master m ON m.type = 'index' AND m.name = s.idx "
+            "WHERE s.tbl = %s AND (m.sql IS NULL OR m.sql NOT LIKE '%% WHERE %%')"
+        )
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    return row[0] if row and row[0] and row[0] > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if not qs.query.where:
+            estimate = estimated_count(qs)
+            if estimate and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class IndexedSearchMixin:
+    """
+    Admin search that the indexes can answer.
+
+    Django turns '^field' into istartswith and '=field' into iexact, which
+    SQLite (LIKE without a NOCASE index) and PostgreSQL (UPPER(col) LIKE)
+    can only evaluate with a full scan. Here both sides are upper-cased and
+    matched against the UPPER(col) expression indexes of migration 0009:
+    '=' is an equality and '^' a prefix bounded by a range, so both backends
+    search the index and the LIKE only re-checks the matches.
+    """
+
+    def search_lookups(self, field, term, opts=None):
+        opts = opts or self.opts
+        prefix, name = (field[0], field[1:]) if field[0] in '^=' else ('', field)
+        if '__' in name:
+            # Search the related table through its own index and match the
+            # foreign key, instead of filtering the joined rows one by one.
+            rel, rest = name.split('__', 1)
+            related = opts.get_field(rel).related_model
+            inner = related._default_manager.filter(self.search_lookups(prefix + rest, term, related._meta))
+            return Q(**{f'{rel}__in': inner.values('pk')})
+        if prefix == '=':
+            return Q(**{f'{name}__upper': term.upper()})
+        if prefix == '^':
+            term = term.upper()
+            return Q(**{f'{name}__upper__gte': term, f'{name}__upper__lt': term + '\U0010ffff',
+                        f'{name}__upper__startswith': term})
+        return Q(**{f'{name}__icontains': term})
+
+    def get_search_results(self, request, queryset, search_term):
+        search_fields = self.get_search_fields(request)
+        if not search_fields or not search_term:
+            return queryset, False
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            queryset = queryset.filter(reduce(operator.or_, (self.search_lookups(f, bit) for f in search_fields)))
+        use_distinct = any(lookup_needs_distinct(self.opts, f.lstrip('^=')) for f in search_fields)
+        return queryset, use_distinct
+
+
+class LargeTableAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class EquipModelAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ['name', 'category', 'date_buy', 'status', 'si']
+    list_filter = ['category', 'status']
+    list_select_related = ['si']
+    search_fields = ['^name']
+
+
+class EquipAdmin(LargeTableAdmin):
+    list_display = ['name', 'model', 'prop_no', 'barcode', 'status']
+    list_filter = ['status', 'model__category']
+    list_select_related = ['model']
+    search_fields = ['^name', '^prop_no', '=barcode']
+    ordering = ['name']
+    autocomplete_fields = ['model']
+
+
+class ApplicantAdmin(LargeTableAdmin):
+    list_display = ['name', 'role', 'status', 'email', 'phone']
+    list_filter = ['role', 'status']
+    search_fields = ['^name', '=email']
+    ordering = ['name']
+
+
+class LogAdminForm(forms.ModelForm):
+    def clean(self):
+        # The partial unique constraint is not checked by model validation.
+        cleaned = super().clean()
+        equip = cleaned.get('equip')
+        if equip and not cleaned.get('date_return'):
+            if Log.objects.filter(equip=equip, date_return=None).exclude(pk=self.instance.pk).exists():
+                raise forms.ValidationError(OPEN_LOAN_ERROR)
+        return cleaned
+
+
+class LogAdmin(LargeTableAdmin):
+    form = LogAdminForm
+    list_display = ['date_apply', 'user', 'equip', 'date_return', 'author']
+    list_select_related = ['user', 'equip', 'author']
+    search_fields = ['^equip__name', '=equip__barcode', '^user__name']
+    date_hierarchy = 'date_apply'
+    autocomplete_fields = ['equip', 'user']
+    raw_id_fields = ['author']
+
+
+class InventoryAdmin(admin.ModelAdmin):
+    list_display = ['year']
+
+    def get_queryset(self, request):
+        # The register JSON can be megabytes per year; the changelist only
+        # needs the year.
+        qs = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('changelist'):
+            qs = qs.defer('invlist')
+        return qs
+
+
+class InventoryLogAdmin(LargeTableAdmin):
+    list_display = ['date_checked', 'equip', 'author']
+    list_select_related = ['equip', 'author']
+    search_fields = ['^equip__name', '=equip__barcode']
+    date_hierarchy = 'date_checked'
+    autocomplete_fields = ['equip']
+    raw_id_fields = ['author']
+
+
+class LoanReminderAdmin(LargeTableAdmin):
+    list_display = ['created', 'user', 'email', 'status', 'attempts', 'sent']
+    list_filter = ['status']
+    list_select_related = ['user']
+    search_fields = ['^user__name', '=email']
+    ordering = ['-id']
+    raw_id_fields = ['user']
+
+
+admin.site.register(Model, EquipModelAdmin)
+admin.site.register(Equip, EquipAdmin)
+admin.site.register(Applicant, ApplicantAdmin)
+admin.site.register(Log, LogAdmin)
+admin.site.register(Inventory, InventoryAdmin)
+admin.site.register(InventoryLog, InventoryLogAdmin)
+admin.site.register(LoanReminder, LoanReminderAdmin)
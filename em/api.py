@@ -0,0 +1,276 @@
+"""
+Read-only JSON API.
+
+    GET /em/api/<resource>/?fields=id,name&<filter>=<value>&after=<id>&limit=<n>
+    GET /em/feed/<entity>/?since=<cursor>&deleted_after=<id>&limit=<n>
+
+Rows come straight from .values() (no model instances, no templates) in id
+order with keyset pagination: pass ``after`` = the previous ``next``.
+Filters are limited to indexed columns. Responses are compact JSON, gzip
+when the client accepts it, or msgpack with ``format=msgpack`` (needs the
+msgpack package).
+
+The change feed pages through rows by (modified, id) instead, and reports
+deletions from the Tombstone table, so a client can mirror an entity
+incrementally. Both views parse and reject arguments the same way.
+"""
+
+import json
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.text import compress_string
+from django.views.generic import View
+
+from .models import *
+from .signals import FEED_MODELS
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def bigint(value):
+    # Larger ids would only fail inside the database driver.
+    number = int(value)
+    if not -2 ** 63 <= number < 2 ** 63:
+        raise OverflowError(value)
+    return number
+
+
+def parse_year(value):
+    year = int(value)
+    start = timezone.make_aware(datetime(year, 1, 1))
+    return start, timezone.make_aware(datetime(year + 1, 1, 1)) - timedelta(microseconds=1)
+
+
+def checked(parser):
+    def parse(value):
+        parsed = parser(value)
+        if parsed is None:
+            raise ValueError(value)
+        return parsed
+    return parse
+
+
+def parse_aware_datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is not None:
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        # Out-of-range instants (e.g. 0001-01-01 in UTC+8) overflow here, not in the driver.
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed
+
+
+DATE = checked(parse_date)
+DATETIME = checked(parse_aware_datetime)
+
+RESOURCES = {
+    'model': {
+        'queryset': Model.objects.all(),
+        'permission': 'em.view_model',
+        'fields': ['id', 'name', 'date_buy', 'specification', 'status', 'category', 'si_id', 'pic', 'modified'],
+        'filters': {
+            'name': ('name', str),
+            'name_prefix': ('name__startswith', str),
+            'si': ('si_id', bigint),
+            'modified_after': ('modified__gt', DATETIME),
+        },
+    },
+    'equip': {
+        'queryset': Equip.objects.all(),
+        'permission': 'em.view_equip',
+        'fields': ['id', 'model_id', 'name', 'prop_no', 'barcode', 'memo', 'status', 'modified'],
+        'filters': {
+            'model': ('model_id', bigint),
+            'name': ('name', str),
+            'name_prefix': ('name__startswith', str),
+            'barcode': ('barcode', str),
+            'prop_no': ('prop_no', str),
+            'modified_after': ('modified__gt', DATETIME),
+        },
+    },
+    'applicant': {
+        'queryset': Applicant.objects.all(),
+        'permission': 'em.view_applicant',
+        'fields': ['id', 'role', 'status', 'name', 'email', 'phone', 'modified'],
+        'filters': {
+            'name': ('name', str),
+            'name_prefix': ('name__startswith', str),
+            'email': ('email', str),
+            'modified_after': ('modified__gt', DATETIME),
+        },
+    },
+    'log': {
+        'queryset': Log.objects.all(),
+        'permission': 'em.view_log',
+        'fields': ['id', 'equip_id', 'user_id', 'date_apply', 'date_return', 'author_id', 'modified'],
+        'filters': {
+            'equip': ('equip_id', bigint),
+            'user': ('user_id', bigint),
+            'applied_from': ('date_apply__gte', DATE),
+            'applied_to': ('date_apply__lte', DATE),
+            'modified_after': ('modified__gt', DATETIME),
+        },
+    },
+    'si': {
+        'queryset': SI.objects.all(),
+        'permission': 'em.view_si',
+        'fields': ['id', 'name', 'phone', 'memo'],
+        'filters': {},
+    },
+    'inventory': {
+        'queryset': InventoryLog.objects.all(),
+        'permission': 'em.view_inventory',
+        'fields': ['id', 'equip_id', 'equip__prop_no', 'equip__barcode', 'date_checked', 'author_id'],
+        'filters': {
+            'year': ('date_checked__range', parse_year),
+            'equip': ('equip_id', bigint),
+        },
+    },
+}
+
+
+def page_limit(request, default, maximum):
+    return max(1, min(int(request.GET.get('limit', default)), maximum))
+
+
+def bad_request(message='參數格式錯誤'):
+    return JsonResponse({'error': message}, status=400, json_dumps_params={'ensure_ascii': False})
+
+
+def msgpack_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+class ApiList(PermissionRequiredMixin, View):
+    PAGE_SIZE = 200
+    MAX_PAGE_SIZE = 1000
+    GZIP_MIN_LENGTH = 512
+
+    def dispatch(self, request, *args, **kwargs):
+        self.resource = RESOURCES.get(kwargs['resource'])
+        if self.resource is None:
+            raise Http404('無此資料類型')
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_permission_required(self):
+        return [self.resource['permission']]
+
+    def get(self, request, resource):
+        spec = self.resource
+        fields = request.GET.get('fields')
+        fields = fields.split(',') if fields else spec['fields']
+        unknown = set(fields) - set(spec['fields'])
+        if unknown:
+            return bad_request(f'不支援的欄位：{", ".join(sorted(unknown))}')
+        if 'id' not in fields:
+            fields = ['id'] + fields
+
+        qs = spec['queryset']
+        try:
+            for name, value in request.GET.items():
+                if name in spec['filters']:
+                    lookup, parse = spec['filters'][name]
+                    qs = qs.filter(**{lookup: parse(value)})
+            limit = page_limit(request, self.PAGE_SIZE, self.MAX_PAGE_SIZE)
+            after = bigint(request.GET.get('after', 0))
+        except (ValueError, OverflowError):
+            return bad_request()
+
+        rows = list(qs.filter(id__gt=after).order_by('id').values(*fields)[:limit + 1])
+        more = len(rows) > limit
+        rows = rows[:limit]
+        payload = {'results': rows, 'next': rows[-1]['id'] if more else None}
+        return self.encode(request, payload)
+
+    def encode(self, request, payload):
+        if request.GET.get('format') == 'msgpack':
+            if msgpack is None:
+                return bad_request('伺服器未安裝 msgpack')
+            response = HttpResponse(
+                msgpack.packb(payload, default=msgpack_default, use_bin_type=True),
+                content_type='application/msgpack',
+            )
+        else:
+            body = json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+            response = HttpResponse(body.encode(), content_type='application/json')
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if (len(response.content) >= self.GZIP_MIN_LENGTH and
+                'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            response.content = compress_string(response.content)
+            response['Content-Encoding'] = 'gzip'
+            response['Content-Length'] = str(len(response.content))
+        return response
+
+
+class ChangeFeed(PermissionRequiredMixin, View):
+    FEED_FIELDS = {
+        'model': ['id', 'name', 'date_buy', 'specification', 'status', 'category', 'si_id', 'oid', 'pic', 'modified'],
+        'equip': ['id', 'model_id', 'name', 'prop_no', 'barcode', 'memo', 'status', 'oid', 'modified'],
+        'applicant': ['id', 'role', 'status', 'name', 'email', 'phone', 'oid', 'modified'],
+        'log': ['id', 'equip_id', 'user_id', 'date_apply', 'date_return', 'author_id', 'oid', 'modified'],
+    }
+    PAGE_SIZE = 500
+    MAX_PAGE_SIZE = 5000
+    # `modified` is stamped before the transaction commits, and a writer may
+    # wait up to the SQLite busy timeout (20 s) for the lock, so recent rows
+    # are only handed out once they are older than that.
+    SAFETY_LAG = timedelta(seconds=60)
+
+    def get_permission_required(self):
+        return [f"em.view_{self.kwargs['entity']}"]
+
+    def get(self, request, entity):
+        if entity not in FEED_MODELS:
+            raise Http404('無此資料類型')
+        try:
+            limit = page_limit(request, self.PAGE_SIZE, self.MAX_PAGE_SIZE)
+            deleted_after = bigint(request.GET.get('deleted_after', 0))
+            since, last_id = self.parse_cursor(request.GET.get('since', ''))
+        except (ValueError, OverflowError):
+            return bad_request()
+        horizon = timezone.now() - self.SAFETY_LAG
+
+        # Always the primary: a row missing from a lagging replica would be
+        # skipped for good once the cursor has moved past it.
+        qs = FEED_MODELS[entity].objects.using('default').filter(modified__lt=horizon)
+        if since:
+            qs = qs.filter(Q(modified__gt=since) | Q(modified=since, id__gt=last_id))
+        rows = list(qs.order_by('modified', 'id').values(*self.FEED_FIELDS[entity])[:limit + 1])
+        tombstones = list(Tombstone.objects.using('default').filter(
+            entity=entity, id__gt=deleted_after, deleted__lt=horizon,
+        ).order_by('id').values('id', 'object_id', 'deleted')[:limit + 1])
+        more = len(rows) > limit or len(tombstones) > limit
+        rows, tombstones = rows[:limit], tombstones[:limit]
+
+        if rows:
+            since, last_id = rows[-1]['modified'], rows[-1]['id']
+        return JsonResponse({
+            'entity': entity,
+            'results': rows,
+            'deleted': [{'id': t['object_id'], 'deleted': t['deleted']} for t in tombstones],
+            'next': {
+                'since': f'{since.isoformat()},{last_id}' if since else '',
+                'deleted_after': tombstones[-1]['id'] if tombstones else deleted_after,
+            },
+            'more': more,
+        }, json_dumps_params={'ensure_ascii': False})
+
+    @staticmethod
+    def parse_cursor(cursor):
+        if not cursor:
+            return None, 0
+        ts, _, last_id = cursor.partition(',')
+        return DATETIME(ts), bigint(last_id or 0)
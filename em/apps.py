@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class EmConfig(AppConfig):
     name = 'em'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,109 @@
+import gzip
+import json
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import FileSystemFinder
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.utils import get_app_template_dirs
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_TAG_RE = re.compile(r"""{%\s*static\s+['"]([^'"]+)['"]""")
+CSS_URL_RE = re.compile(r"""url\(\s*['"]?(?!data:|#|[a-z]+:|/)([^'")?#]+)""")
+COMPRESS_EXTS = {'.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.ttf', '.eot', '.otf'}
+
+
+class Command(BaseCommand):
+    help = '在 collectstatic 之後執行：移除樣板未使用的專案靜態檔，並產生 .gz/.br 壓縮檔'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-unused', action='store_true', help='不移除未使用的靜態檔')
+        parser.add_argument('--dry-run', action='store_true', help='只列出結果，不修改檔案')
+
+    def handle(self, *args, **options):
+        root = Path(settings.STATIC_ROOT)
+        manifest_path = root / staticfiles_storage.manifest_name
+        if not manifest_path.exists():
+            raise CommandError(f'找不到 {manifest_path}，請先執行 collectstatic')
+        manifest = json.loads(manifest_path.read_text())
+        paths = manifest['paths']
+        self.dry_run = options['dry_run']
+
+        if not options['keep_unused']:
+            for name in sorted(self.unused_assets(root)):
+                self.remove(root, name, paths.pop(name, None))
+            if not self.dry_run:
+                manifest_path.write_text(json.dumps(manifest))
+                for d in sorted(root.rglob('*'), reverse=True):
+                    if d.is_dir() and not any(d.iterdir()):
+                        d.rmdir()
+
+        written = 0
+        for hashed in sorted(set(paths.values())):
+            if posixpath.splitext(hashed)[1] in COMPRESS_EXTS:
+                written += self.compress(root / hashed)
+        self.stdout.write(self.style.SUCCESS(f'完成：{len(paths)} 個靜態檔，產生 {written} 個壓縮檔'))
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('未安裝 brotli 套件，僅產生 .gz'))
+
+    def referenced_assets(self):
+        dirs = [Path(d) for t in settings.TEMPLATES for d in t.get('DIRS', [])]
+        dirs += [Path(d) for d in get_app_template_dirs('templates')]
+        used = set()
+        for d in dirs:
+            for tpl in d.rglob('*.html'):
+                used.update(STATIC_TAG_RE.findall(tpl.read_text(errors='ignore')))
+        return used
+
+    def unused_assets(self, root):
+        # Only assets shipped from STATICFILES_DIRS are candidates; app assets
+        # (admin) are also referenced from Python form media.
+        project = {path for path, _ in FileSystemFinder().list(['CVS', '.*', '*~'])}
+        pending = list(self.referenced_assets())
+        used = set()
+        while pending:
+            name = pending.pop()
+            if name in used:
+                continue
+            used.add(name)
+            if name.endswith('.css') and (root / name).exists():
+                css = (root / name).read_text(errors='ignore')
+                base = posixpath.dirname(name)
+                pending += [posixpath.normpath(posixpath.join(base, u)) for u in CSS_URL_RE.findall(css)]
+        return {name for name in project if name not in used}
+
+    def remove(self, root, name, hashed):
+        self.stdout.write(f'移除未使用：{name}')
+        if self.dry_run:
+            return
+        for target in {name, hashed} - {None}:
+            for path in (root / target, root / f'{target}.gz', root / f'{target}.br'):
+                if path.exists():
+                    path.unlink()
+
+    def compress(self, path):
+        if not path.exists():
+            return 0
+        data = path.read_bytes()
+        count = 0
+        variants = [('.gz', lambda d: gzip.compress(d, 9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', lambda d: brotli.compress(d, quality=11)))
+        for suffix, func in variants:
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+                continue
+            packed = func(data)
+            if len(packed) >= len(data):
+                continue
+            if not self.dry_run:
+                target.write_bytes(packed)
+            count += 1
+        return count
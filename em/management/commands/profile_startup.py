@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Start-up budget for one worker, checked by --check and em.tests.
+BOOT_SECONDS_BUDGET = 3.0
+BOOT_RSS_MB_BUDGET = 120
+
+BOOT_SCRIPT = """
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+application = importlib.import_module(sys.argv[1]).application
+from django.conf import settings
+importlib.import_module(settings.ROOT_URLCONF)
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': sorted(sys.modules),
+}))
+"""
+
+
+def measure_startup(entry='cc.wsgi'):
+    """
+    Boot ``entry`` (and the URLconf, i.e. all views) in a fresh interpreter
+    under ``-X importtime``. Returns wall time, peak RSS, loaded modules and
+    per-module cumulative import times in microseconds.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'cc.settings'))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT, entry],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise CommandError(proc.stderr.strip().splitlines()[-1])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    imports = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports[name.strip()] = int(cumulative)
+    result['imports'] = imports
+    return result
+
+
+class Command(BaseCommand):
+    help = '量測 worker 啟動：各模組載入時間與記憶體用量（cc.wsgi / cc.asgi）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entry', default='cc.wsgi', choices=['cc.wsgi', 'cc.asgi'])
+        parser.add_argument('--top', type=int, default=25, help='列出最耗時的前 N 個模組')
+        parser.add_argument('--check', action='store_true', help='超出預算時以錯誤結束')
+
+    def handle(self, *args, **options):
+        result = measure_startup(options['entry'])
+        rss_mb = result['rss_kb'] / 1024
+        top_level = {}
+        for name, usec in result['imports'].items():
+            top = name.split('.')[0]
+            top_level[top] = max(top_level.get(top, 0), usec)
+
+        self.stdout.write(f'{options["entry"]}：啟動 {result["seconds"]:.3f} 秒，RSS {rss_mb:.1f} MB，{len(result["modules"])} 個模組')
+        self.stdout.write('\n套件（累計毫秒）')
+        for name, usec in sorted(top_level.items(), key=lambda i: -i[1])[:options['top']]:
+            self.stdout.write(f'{usec / 1000:10.1f}  {name}')
+        self.stdout.write('\n模組（累計毫秒）')
+        for name, usec in sorted(result['imports'].items(), key=lambda i: -i[1])[:options['top']]:
+            self.stdout.write(f'{usec / 1000:10.1f}  {name}')
+
+        if options['check']:
+            if result['seconds'] > BOOT_SECONDS_BUDGET or rss_mb > BOOT_RSS_MB_BUDGET:
+                raise CommandError(f'超出啟動預算（{BOOT_SECONDS_BUDGET} 秒 / {BOOT_RSS_MB_BUDGET} MB）')
+            self.stdout.write(self.style.SUCCESS('符合啟動預算'))
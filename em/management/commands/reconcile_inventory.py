@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from em import reconciliation
+from em.models import Inventory
+
+
+class Command(BaseCommand):
+    help = '年度盤點對帳：列出各類差異筆數，並可匯出 csv / xlsx'
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int)
+        parser.add_argument('--output', help='匯出檔案路徑（副檔名 .csv 或 .xlsx）')
+
+    def handle(self, *args, **options):
+        try:
+            tables = reconciliation.as_tables(reconciliation.reconcile(options['year']))
+        except Inventory.DoesNotExist:
+            raise CommandError(f'找不到 {options["year"]} 年度盤點清冊')
+        for key, label, headers, rows in tables:
+            self.stdout.write(f'{label}：{len(rows)}')
+        if options['output']:
+            path = Path(options['output'])
+            fmt = path.suffix.lstrip('.')
+            if fmt not in ('csv', 'xlsx'):
+                raise CommandError('僅支援 .csv 或 .xlsx')
+            path.write_bytes(reconciliation.export(tables, fmt)[0])
+            self.stdout.write(self.style.SUCCESS(f'已匯出 {path}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from em import reminders
+
+
+class Command(BaseCommand):
+    help = '逾期未還提醒：每位借用人彙整成一封信寄出，失敗者於下次執行時重試'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=parse_date, help='以指定日期計算逾期天數（YYYY-MM-DD，預設今天）')
+        parser.add_argument('--no-send', action='store_true', help='只建立待寄信件，不寄出')
+
+    def handle(self, *args, **options):
+        today = options['date'] or timezone.localdate()
+        self.stdout.write(f'新增提醒信：{reminders.enqueue(today)}')
+        if options['no_send']:
+            return
+        sent, failed = reminders.send_pending()
+        self.stdout.write(self.style.SUCCESS(f'已寄出：{sent}'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'寄送失敗：{failed}（下次執行時重試）'))
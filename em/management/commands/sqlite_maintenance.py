@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = 'SQLite 定期維護：WAL checkpoint、ANALYZE、VACUUM（建議以 cron 於離峰時段執行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--checkpoint', default='TRUNCATE', choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE', 'NONE'],
+            help='WAL checkpoint 模式（預設 TRUNCATE，NONE 為略過）',
+        )
+        parser.add_argument('--no-analyze', action='store_true', help='略過 ANALYZE')
+        parser.add_argument('--vacuum', action='store_true', help='執行 VACUUM（會鎖定整個資料庫）')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'{options["database"]} 不是 SQLite 資料庫')
+
+        with connection.cursor() as cursor:
+            if options['checkpoint'] != 'NONE':
+                cursor.execute(f'PRAGMA wal_checkpoint({options["checkpoint"]})')
+                busy, log_pages, moved = cursor.fetchone()
+                self.stdout.write(f'checkpoint：busy={busy} wal={log_pages} 頁，已寫回 {moved} 頁')
+            if not options['no_analyze']:
+                cursor.execute('ANALYZE')
+                cursor.execute('PRAGMA optimize')
+                self.stdout.write('ANALYZE 完成')
+            if options['vacuum']:
+                cursor.execute('VACUUM')
+                self.stdout.write('VACUUM 完成')
+        self.stdout.write(self.style.SUCCESS('維護完成'))
@@ -0,0 +1,106 @@
+import io
+import sqlite3
+from urllib.parse import quote
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+def copy_text(value):
+    """Encode one value for COPY ... FROM STDIN (text format)."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bytes):
+        return '\\\\x' + value.hex()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class Command(BaseCommand):
+    help = '將 SQLite 資料庫以 COPY 批次搬移到 PostgreSQL（目標需已執行 migrate），並比對筆數'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=str(settings.BASE_DIR / 'db.sqlite3'), help='來源 SQLite 檔案')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='目標 PostgreSQL 連線')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--verify-only', action='store_true', help='只比對來源與目標的筆數與最大 id')
+
+    def handle(self, *args, **options):
+        source = self.open_source(options['source'])
+        tables = self.tables(source)
+        if not tables:
+            raise CommandError(f'{options["source"]} 中沒有可搬移的資料表')
+        target = connections[options['database']]
+        if target.vendor != 'postgresql':
+            raise CommandError(f'{options["database"]} 不是 PostgreSQL 資料庫')
+
+        if not options['verify_only']:
+            with transaction.atomic(using=options['database']):
+                with target.cursor() as cursor:
+                    # Django creates PostgreSQL foreign keys DEFERRABLE, so the
+                    # load order does not matter inside one transaction.
+                    cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+                    cursor.execute('TRUNCATE {} CASCADE'.format(
+                        ', '.join(target.ops.quote_name(t) for t, _ in tables)))
+                    for table, columns in tables:
+                        count = self.copy_table(source, cursor, table, columns, options['batch_size'])
+                        self.stdout.write(f'{table}：{count} 筆')
+                    models = [m for m in apps.get_models(include_auto_created=True) if m._meta.db_table in dict(tables)]
+                    for sql in target.ops.sequence_reset_sql(self.style, models):
+                        cursor.execute(sql)
+
+        if self.verify(source, target, tables):
+            self.stdout.write(self.style.SUCCESS('比對一致'))
+        else:
+            raise CommandError('來源與目標資料不一致')
+
+    def open_source(self, path):
+        # Read-only URI: a mistyped path must not create an empty database.
+        try:
+            return sqlite3.connect(f'file:{quote(str(path))}?mode=ro', uri=True)
+        except sqlite3.OperationalError as e:
+            raise CommandError(f'無法開啟來源 SQLite 檔案 {path}：{e}')
+
+    def tables(self, source):
+        existing = {r[0] for r in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        tables = []
+        for model in apps.get_models(include_auto_created=True):
+            opts = model._meta
+            if opts.proxy or not opts.managed or opts.db_table not in existing:
+                continue
+            tables.append((opts.db_table, [f.column for f in opts.local_concrete_fields]))
+        return tables
+
+    def copy_table(self, source, cursor, table, columns, batch_size):
+        cols = ', '.join(f'"{c}"' for c in columns)
+        rows = source.execute(f'SELECT {cols} FROM "{table}"')
+        sql = 'COPY {} ({}) FROM STDIN'.format(
+            cursor.db.ops.quote_name(table), ', '.join(cursor.db.ops.quote_name(c) for c in columns))
+        total = 0
+        while True:
+            batch = rows.fetchmany(batch_size)
+            if not batch:
+                return total
+            buf = io.StringIO()
+            for row in batch:
+                buf.write('\t'.join(copy_text(v) for v in row))
+                buf.write('\n')
+            buf.seek(0)
+            cursor.cursor.copy_expert(sql, buf)
+            total += len(batch)
+
+    def verify(self, source, target, tables):
+        ok = True
+        with target.cursor() as cursor:
+            for table, columns in tables:
+                pk = 'id' if 'id' in columns else columns[0]
+                src = source.execute(f'SELECT COUNT(*), MAX("{pk}") FROM "{table}"').fetchone()
+                cursor.execute('SELECT COUNT(*), MAX({}) FROM {}'.format(
+                    target.ops.quote_name(pk), target.ops.quote_name(table)))
+                dst = cursor.fetchone()
+                if tuple(src) != tuple(dst):
+                    ok = False
+                    self.stdout.write(self.style.ERROR(f'{table}：SQLite {src} ≠ PostgreSQL {dst}'))
+        return ok
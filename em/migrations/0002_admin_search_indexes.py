@@ -0,0 +1,53 @@
+# Generated by Django 3.1.4 on 2026-10-19 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('em', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='applicant',
+            name='email',
+            field=models.EmailField(db_index=True, max_length=128, verbose_name='電子郵件'),
+        ),
+        migrations.AlterField(
+            model_name='applicant',
+            name='name',
+            field=models.CharField(db_index=True, max_length=32, verbose_name='姓名'),
+        ),
+        migrations.AlterField(
+            model_name='equip',
+            name='barcode',
+            field=models.CharField(blank=True, db_index=True, max_length=16, null=True, verbose_name='條碼序號'),
+        ),
+        migrations.AlterField(
+            model_name='equip',
+            name='name',
+            field=models.CharField(db_index=True, max_length=32, verbose_name='設備編號'),
+        ),
+        migrations.AlterField(
+            model_name='equip',
+            name='prop_no',
+            field=models.CharField(blank=True, db_index=True, max_length=32, null=True, verbose_name='財產編號'),
+        ),
+        migrations.AlterField(
+            model_name='inventorylog',
+            name='date_checked',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='盤點日期'),
+        ),
+        migrations.AlterField(
+            model_name='log',
+            name='date_apply',
+            field=models.DateField(db_index=True, verbose_name='借出日期'),
+        ),
+        migrations.AlterField(
+            model_name='model',
+            name='name',
+            field=models.CharField(db_index=True, max_length=64, verbose_name='型號'),
+        ),
+    ]
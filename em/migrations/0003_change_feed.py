@@ -0,0 +1,42 @@
+# Generated by Django 3.1.4 on 2026-10-19 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('em', '0002_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=16, verbose_name='資料類型')),
+                ('object_id', models.IntegerField(verbose_name='資料編號')),
+                ('deleted', models.DateTimeField(auto_now_add=True, verbose_name='刪除時間')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='applicant',
+            index=models.Index(fields=['modified', 'id'], name='em_applican_modifie_bff8ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equip',
+            index=models.Index(fields=['modified', 'id'], name='em_equip_modifie_a8b71a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['modified', 'id'], name='em_log_modifie_6727d0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='model',
+            index=models.Index(fields=['modified', 'id'], name='em_model_modifie_58aaba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['entity', 'id'], name='em_tombston_entity_9a6b83_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.1.4 on 2026-10-19 12:51
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def close_duplicate_open_loans(apps, schema_editor):
+    # Older open loans of an equipment that was lent again are closed on the
+    # date of the following loan, leaving only the newest one open.
+    Log = apps.get_model('em', 'Log')
+    dup = Log.objects.filter(date_return=None).values('equip').annotate(n=Count('id')).filter(n__gt=1)
+    for row in dup:
+        logs = list(Log.objects.filter(equip_id=row['equip'], date_return=None).order_by('date_apply', 'id'))
+        for log, following in zip(logs, logs[1:]):
+            log.date_return = following.date_apply
+            log.save(update_fields=['date_return', 'modified'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('em', '0003_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_open_loans, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='log',
+            constraint=models.UniqueConstraint(condition=models.Q(date_return__isnull=True), fields=('equip',), name='em_log_one_open_loan'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.1.4 on 2026-10-19 12:52
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('em', '0004_one_open_loan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)], verbose_name='數量')),
+                ('date_start', models.DateField(verbose_name='開始日期')),
+                ('date_end', models.DateField(verbose_name='結束日期')),
+                ('memo', models.TextField(blank=True, null=True, verbose_name='備註')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+                ('author', models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='登錄人')),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='em.model', verbose_name='型號')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='em.applicant', verbose_name='預約人')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['model', 'date_end', 'date_start'], name='em_reservat_model_i_c7a46e_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.CheckConstraint(check=models.Q(date_end__gte=django.db.models.expressions.F('date_start')), name='em_reservation_date_range'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.CheckConstraint(check=models.Q(quantity__gte=1), name='em_reservation_quantity'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.4 on 2026-10-19 12:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('em', '0005_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanReminder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=32, unique=True, verbose_name='識別碼')),
+                ('email', models.EmailField(max_length=128, verbose_name='電子郵件')),
+                ('subject', models.CharField(max_length=128, verbose_name='主旨')),
+                ('body', models.TextField(verbose_name='內容')),
+                ('loans', models.JSONField(verbose_name='借用紀錄')),
+                ('status', models.IntegerField(choices=[(0, '待寄送'), (1, '已寄送'), (2, '放棄')], default=0, verbose_name='狀態')),
+                ('attempts', models.IntegerField(default=0, verbose_name='寄送次數')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='錯誤訊息')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='寄送時間')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(condition=models.Q(date_return__isnull=True), fields=['date_apply'], name='em_log_open_date_apply'),
+        ),
+        migrations.AddField(
+            model_name='loanreminder',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='em.applicant', verbose_name='借用人'),
+        ),
+        migrations.AddIndex(
+            model_name='loanreminder',
+            index=models.Index(fields=['status', 'id'], name='em_loanremi_status_a02c7e_idx'),
+        ),
+    ]
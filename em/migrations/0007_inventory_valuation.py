@@ -0,0 +1,23 @@
+# Generated by Django 3.1.4 on 2026-10-19 13:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('em', '0006_loan_reminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryValuation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('columns', models.JSONField(verbose_name='解析結果')),
+                ('computed', models.DateTimeField(auto_now=True, verbose_name='計算時間')),
+                ('inventory', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='valuation', to='em.inventory', verbose_name='盤點清冊')),
+            ],
+        ),
+    ]
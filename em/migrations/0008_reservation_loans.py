@@ -0,0 +1,18 @@
+# Generated by Django 3.1.4 on 2026-10-19 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('em', '0007_inventory_valuation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='loans',
+            field=models.ManyToManyField(blank=True, related_name='reservations', to='em.Log', verbose_name='借出紀錄'),
+        ),
+    ]
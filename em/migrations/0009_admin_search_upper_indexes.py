@@ -0,0 +1,24 @@
+from django.db import migrations
+
+# (index, table, column) searched case-insensitively by the admin through
+# UPPER(column); Django 3.1 has no expression indexes in Meta.indexes.
+UPPER_INDEXES = [
+    ('em_model_name_upper', 'em_model', 'name'),
+    ('em_equip_name_upper', 'em_equip', 'name'),
+    ('em_equip_prop_no_upper', 'em_equip', 'prop_no'),
+    ('em_equip_barcode_upper', 'em_equip', 'barcode'),
+    ('em_applicant_name_upper', 'em_applicant', 'name'),
+    ('em_applicant_email_upper', 'em_applicant', 'email'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('em', '0008_reservation_loans'),
+    ]
+
+    operations = [
+        migrations.RunSQL(f'CREATE INDEX {index} ON {table} (UPPER({column}))', f'DROP INDEX {index}')
+        for index, table, column in UPPER_INDEXES
+    ]
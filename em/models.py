@@ -1,3 +1,4 @@
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -29,7 +30,7 @@ class Model(models.Model):
         (5, '其他週邊'),
     ]
 
-    name = models.CharField('型號', max_length=64)
+    name = models.CharField('型號', max_length=64, db_index=True)
     date_buy = models.DateField('購置日期')
     specification = models.TextField('詳細規格', blank=True, null=True)
     status = models.IntegerField('狀態', choices=STATUS_CHOICES, default=0)
@@ -39,6 +40,9 @@ class Model(models.Model):
     modified = models.DateTimeField('更新時間', auto_now=True)
     pic = models.ImageField('圖片', upload_to=model_pic_name, blank=True, null=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['modified', 'id'])]
+
     def __str__(self):
         return "{} - {}".format(
             self.get_category_display(),
@@ -61,14 +65,17 @@ class Equip(models.Model):
         9: 'uk-label uk-label-danger',
     }
     model = models.ForeignKey(Model, models.CASCADE)
-    name = models.CharField('設備編號', max_length=32)
-    prop_no = models.CharField('財產編號', max_length=32, blank=True, null=True)
-    barcode = models.CharField('條碼序號', max_length=16, blank=True, null=True)
+    name = models.CharField('設備編號', max_length=32, db_index=True)
+    prop_no = models.CharField('財產編號', max_length=32, blank=True, null=True, db_index=True)
+    barcode = models.CharField('條碼序號', max_length=16, blank=True, null=True, db_index=True)
     memo = models.TextField('備註', blank=True, null=True)
     status = models.IntegerField('狀態', choices=STATUS_CHOICE, default=0)
     oid = models.IntegerField('舊編號', default=0)
     modified = models.DateTimeField('更新時間', auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['modified', 'id'])]
+
     def __str__(self):
         return self.name
 
@@ -91,27 +98,48 @@ class Applicant(models.Model):
 
     role = models.IntegerField('身分', choices=ROLE_CHOICES)
     status = models.IntegerField('狀態', choices=STATUS_CHOICES, default=0)
-    name = models.CharField('姓名', max_length=32)
-    email = models.EmailField('電子郵件', max_length=128)
+    name = models.CharField('姓名', max_length=32, db_index=True)
+    email = models.EmailField('電子郵件', max_length=128, db_index=True)
     phone = models.CharField('聯絡電話', max_length=32)
     oid = models.IntegerField('舊編號', default=0)
     modified = models.DateTimeField('更新時間', auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['modified', 'id'])]
+
     def __str__(self):
         return "{}:{}".format(
             self.get_role_display(), 
             self.name,
         )
 
+# 違反 em_log_one_open_loan 時顯示給使用者的訊息
+OPEN_LOAN_ERROR = '此設備已有未歸還的借用紀錄（可能剛被其他人借出），請重新整理後再試。'
+
 class Log(models.Model):
     equip = models.ForeignKey(Equip, models.CASCADE, verbose_name='設備')
     user = models.ForeignKey(Applicant, models.CASCADE, verbose_name='借用人')
-    date_apply = models.DateField('借出日期')
+    date_apply = models.DateField('借出日期', db_index=True)
     date_return = models.DateField('歸還日期', blank=True, null=True)
     oid = models.IntegerField('舊編號', default=0)
     modified = models.DateTimeField('更新時間', auto_now=True)
     author = models.ForeignKey(User, models.CASCADE, verbose_name='登錄人', default=1)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified', 'id']),
+            # 逾期未還提醒：只索引未歸還的借用紀錄
+            models.Index(fields=['date_apply'], condition=models.Q(date_return__isnull=True), name='em_log_open_date_apply'),
+        ]
+        constraints = [
+            # 同一設備最多只能有一筆未歸還的借用紀錄
+            models.UniqueConstraint(
+                fields=['equip'],
+                condition=models.Q(date_return__isnull=True),
+                name='em_log_one_open_loan',
+            ),
+        ]
+
     def __str__(self):
         return "{}:{}:{}".format(
             self.date_apply.strftime("Y-m-d"),
@@ -126,9 +154,18 @@ class Inventory(models.Model):
     def __str__(self):
         return str(self.year)+"年度"
 
+# 清冊帳面價值、報廢年限解析結果的快取，清冊重新匯入時清除（見 signals.py）
+class InventoryValuation(models.Model):
+    inventory = models.OneToOneField(Inventory, models.CASCADE, related_name='valuation', verbose_name='盤點清冊')
+    columns = models.JSONField('解析結果')
+    computed = models.DateTimeField('計算時間', auto_now=True)
+
+    def __str__(self):
+        return "{}:{}".format(self.inventory, self.computed)
+
 class InventoryLog(models.Model):
     equip = models.ForeignKey(Equip, models.CASCADE, verbose_name='設備')
-    date_checked = models.DateTimeField('盤點日期', auto_now=True)
+    date_checked = models.DateTimeField('盤點日期', auto_now=True, db_index=True)
     author = models.ForeignKey(User, models.CASCADE, verbose_name='登錄人', default=1)
 
     def __str__(self):
@@ -136,4 +173,71 @@ class InventoryLog(models.Model):
             self.date_checked,
             self.equip.name, 
             self.author.first_name,
-        )
\ No newline at end of file
+        )
+
+class Reservation(models.Model):
+    model = models.ForeignKey(Model, models.CASCADE, verbose_name='型號')
+    quantity = models.PositiveIntegerField('數量', default=1, validators=[MinValueValidator(1)])
+    user = models.ForeignKey(Applicant, models.CASCADE, verbose_name='預約人')
+    date_start = models.DateField('開始日期')
+    date_end = models.DateField('結束日期')
+    memo = models.TextField('備註', blank=True, null=True)
+    author = models.ForeignKey(User, models.CASCADE, verbose_name='登錄人', default=1)
+    modified = models.DateTimeField('更新時間', auto_now=True)
+    # 依此預約借出的紀錄，可用數量計算時不重複扣除
+    loans = models.ManyToManyField(Log, blank=True, related_name='reservations', verbose_name='借出紀錄')
+
+    class Meta:
+        # 區間重疊查詢：date_end >= A AND date_start <= B
+        indexes = [models.Index(fields=['model', 'date_end', 'date_start'])]
+        constraints = [
+            models.CheckConstraint(check=models.Q(date_end__gte=models.F('date_start')), name='em_reservation_date_range'),
+            models.CheckConstraint(check=models.Q(quantity__gte=1), name='em_reservation_quantity'),
+        ]
+
+    def __str__(self):
+        return "{}~{}:{}:{}x{}".format(
+            self.date_start,
+            self.date_end,
+            self.user.name,
+            self.model.name,
+            self.quantity,
+        )
+
+# 刪除紀錄：異動同步 (change feed) 以此回報已刪除的資料
+class Tombstone(models.Model):
+    entity = models.CharField('資料類型', max_length=16)
+    object_id = models.IntegerField('資料編號')
+    deleted = models.DateTimeField('刪除時間', auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['entity', 'id'])]
+
+    def __str__(self):
+        return "{}:{}".format(self.entity, self.object_id)
+
+# 逾期提醒信寄件匣：每人每天一封，寄送失敗者於下次執行時重試
+class LoanReminder(models.Model):
+    STATUS_CHOICES = [
+        (0, '待寄送'),
+        (1, '已寄送'),
+        (2, '放棄'),
+    ]
+
+    user = models.ForeignKey(Applicant, models.CASCADE, verbose_name='借用人')
+    key = models.CharField('識別碼', max_length=32, unique=True)
+    email = models.EmailField('電子郵件', max_length=128)
+    subject = models.CharField('主旨', max_length=128)
+    body = models.TextField('內容')
+    loans = models.JSONField('借用紀錄')
+    status = models.IntegerField('狀態', choices=STATUS_CHOICES, default=0)
+    attempts = models.IntegerField('寄送次數', default=0)
+    last_error = models.TextField('錯誤訊息', blank=True, default='')
+    created = models.DateTimeField('建立時間', auto_now_add=True)
+    sent = models.DateTimeField('寄送時間', blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'id'])]
+
+    def __str__(self):
+        return "{}:{}".format(self.key, self.get_status_display())
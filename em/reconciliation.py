@@ -0,0 +1,214 @@
+"""
+Yearly inventory reconciliation.
+
+Compares one year's register (Inventory.invlist, keyed by prop_no) with the
+Equip table, that year's InventoryLog checks and open loans. Everything is
+loaded with four flat .values() queries and compared as sets/dicts, so the
+cost is linear in the register size.
+
+compare_years() diffs two registers by prop_no in one merge pass; only the
+compared fields of each item are kept, so any pair of years can be compared
+without holding two full registers in memory.
+"""
+
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import connections
+from django.utils import timezone
+
+from .models import Equip, Inventory, InventoryLog, Log
+
+EQUIP_FIELDS = ['id', 'name', 'prop_no', 'barcode', 'status', 'model__name', 'model__status']
+
+CATEGORIES = [
+    ('unmatched_register', '清冊有、系統無對應設備', ['prop_no', '財產名稱', '財產別名', '存置地點', '保管人']),
+    ('missing_from_register', '有條碼但不在清冊', ['name', 'prop_no', 'barcode', 'model__name']),
+    ('duplicate_barcode', '條碼重複', ['barcode', 'name', 'prop_no', 'model__name']),
+    ('duplicate_prop_no', '財產編號重複', ['prop_no', 'name', 'barcode', 'model__name']),
+    ('checked_on_loan', '已盤點但目前借出中', ['name', 'prop_no', 'applicant', 'date_apply', 'date_checked']),
+    ('scrapped_listed', '已報廢仍列於清冊', ['name', 'prop_no', 'status', 'model__name']),
+    ('unchecked', '清冊中尚未盤點', ['name', 'prop_no', 'barcode', 'model__name']),
+]
+
+
+def year_range(year):
+    start = timezone.make_aware(datetime(year, 1, 1))
+    return start, timezone.make_aware(datetime(year + 1, 1, 1))
+
+
+def reconcile(year):
+    """Return [(key, label, columns, rows)] for each category, rows are dicts."""
+    invlist = Inventory.objects.values_list('invlist', flat=True).get(year=year)
+    register = set(invlist)
+
+    equips = list(Equip.objects.values(*EQUIP_FIELDS))
+    by_prop = defaultdict(list)
+    by_barcode = defaultdict(list)
+    for e in equips:
+        if e['prop_no']:
+            by_prop[e['prop_no']].append(e)
+        if e['barcode']:
+            by_barcode[e['barcode']].append(e)
+
+    start, end = year_range(year)
+    checked = dict(InventoryLog.objects.filter(date_checked__gte=start, date_checked__lt=end)
+                   .order_by('date_checked').values_list('equip_id', 'date_checked'))
+    loans = {row['equip_id']: row for row in Log.objects.filter(date_return=None)
+             .values('equip_id', 'user__name', 'date_apply')}
+    status_display = dict(Equip.STATUS_CHOICE)
+
+    result = {
+        'unmatched_register': [
+            {'prop_no': prop, **{k: invlist[prop].get(k, '') for k in ('財產名稱', '財產別名', '存置地點', '保管人')}}
+            for prop in sorted(register - set(by_prop))
+        ],
+        'missing_from_register': [
+            e for e in equips if e['barcode'] and e['prop_no'] not in register
+        ],
+        'duplicate_barcode': [
+            e for rows in by_barcode.values() if len(rows) > 1 for e in rows
+        ],
+        'duplicate_prop_no': [
+            e for rows in by_prop.values() if len(rows) > 1 for e in rows
+        ],
+        'checked_on_loan': [
+            {**e, 'applicant': loans[e['id']]['user__name'], 'date_apply': loans[e['id']]['date_apply'],
+             'date_checked': checked[e['id']]}
+            for e in equips if e['id'] in checked and e['id'] in loans
+        ],
+        'scrapped_listed': [
+            {**e, 'status': status_display[e['status']] if e['status'] == 9 else '型號報廢除帳'}
+            for e in equips if e['prop_no'] in register and (e['status'] == 9 or e['model__status'] == 1)
+        ],
+        'unchecked': [
+            e for e in equips if e['prop_no'] in register and e['id'] not in checked
+        ],
+    }
+    return [(key, label, columns, result[key]) for key, label, columns in CATEGORIES]
+
+
+COLUMN_LABELS = {
+    'prop_no': '財產編號',
+    'name': '設備編號',
+    'barcode': '條碼序號',
+    'model__name': '型號',
+    'status': '狀態',
+    'applicant': '借用人',
+    'date_apply': '借出日期',
+    'date_checked': '盤點日期',
+}
+
+
+def cell(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M')
+    return '' if value is None else value
+
+
+def as_tables(report, labels=COLUMN_LABELS):
+    """[(key, label, headers, rows as lists)] for templates and exports."""
+    return [
+        (key, label, [labels.get(c, c) for c in columns],
+         [[cell(row.get(c)) for c in columns] for row in rows])
+        for key, label, columns, rows in report
+    ]
+
+
+def export(tables, fmt):
+    """Return (content, content_type) for a csv or xlsx export of as_tables()."""
+    if fmt == 'csv':
+        import csv
+        import io
+
+        out = io.StringIO()
+        writer = csv.writer(out)
+        for key, label, headers, rows in tables:
+            writer.writerow(['類別'] + headers)
+            writer.writerows([label] + row for row in rows)
+            writer.writerow([])
+        return out.getvalue().encode('utf-8-sig'), 'text/csv; charset=utf-8'
+    if fmt == 'xlsx':
+        import pyexcel
+
+        book = pyexcel.get_book(bookdict={label: [headers] + rows for key, label, headers, rows in tables})
+        return (book.save_to_memory('xlsx').getvalue(),
+                'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    raise ValueError(fmt)
+
+
+COMPARE_FIELDS = ['財產名稱', '存置地點', '保管單位', '保管人', '使用單位']
+
+COMPARE_CATEGORIES = [
+    ('added', '新增', ['prop_no', '財產名稱', '存置地點', '保管單位']),
+    ('disposed', '減少（報廢或移出清冊）', ['prop_no', '財產名稱', '存置地點', '保管單位']),
+    ('moved', '存置地點變更', ['prop_no', '財產名稱', 'before', 'after']),
+    ('custody', '保管單位／保管人變更', ['prop_no', '財產名稱', 'before', 'after']),
+    ('missing', '去年已盤、今年未盤', ['prop_no', '財產名稱', '存置地點', '保管人']),
+]
+
+COMPARE_LABELS = {**COLUMN_LABELS, 'before': '原', 'after': '新'}
+
+
+def register_fields(year, fields=COMPARE_FIELDS):
+    """
+    {prop_no: (財產名稱, 存置地點, ...)} for one year. The register is walked
+    row by row with the database's JSON functions instead of decoding the
+    whole blob at once, and only ``fields`` are kept.
+    """
+    if not Inventory.objects.filter(year=year).exists():
+        raise Inventory.DoesNotExist(year)
+    connection = connections[Inventory.objects.db]
+    table = connection.ops.quote_name(Inventory._meta.db_table)
+    if connection.vendor == 'postgresql':
+        cols = ', '.join(f"j.value ->> '{f}'" for f in fields)
+        sql = f'SELECT j.key, {cols} FROM {table} i, jsonb_each(i.invlist) j WHERE i.year = %s'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [year])
+            return {row[0]: row[1:] for row in cursor}
+    if connection.vendor == 'sqlite':
+        # json_extract() paths do not match keys stored as \uXXXX escapes, so
+        # each item is decoded in Python instead.
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT j.key, j.value FROM {table} i, json_each(i.invlist) j WHERE i.year = %s', [year])
+            return {key: project(json.loads(value), fields) for key, value in cursor}
+    invlist = Inventory.objects.values_list('invlist', flat=True).get(year=year)
+    return {key: project(item, fields) for key, item in invlist.items()}
+
+
+def project(item, fields):
+    return tuple(item.get(f) for f in fields)
+
+
+def checked_prop_nos(year):
+    start, end = year_range(year)
+    return set(InventoryLog.objects.filter(date_checked__gte=start, date_checked__lt=end)
+               .values_list('equip__prop_no', flat=True))
+
+
+def compare_years(old_year, new_year):
+    """Diff two registers keyed by prop_no; same shape as reconcile()."""
+    old, new = register_fields(old_year), register_fields(new_year)
+    old_checked, new_checked = checked_prop_nos(old_year), checked_prop_nos(new_year)
+    name, place, unit, keeper = 0, 1, 2, 3
+    result = {key: [] for key, label, columns in COMPARE_CATEGORIES}
+
+    for prop in sorted(old.keys() | new.keys()):
+        a, b = old.get(prop), new.get(prop)
+        if a is None:
+            result['added'].append({'prop_no': prop, '財產名稱': b[name], '存置地點': b[place], '保管單位': b[unit]})
+            continue
+        if b is None:
+            result['disposed'].append({'prop_no': prop, '財產名稱': a[name], '存置地點': a[place], '保管單位': a[unit]})
+            continue
+        if a[place] != b[place]:
+            result['moved'].append({'prop_no': prop, '財產名稱': b[name], 'before': a[place], 'after': b[place]})
+        if (a[unit], a[keeper]) != (b[unit], b[keeper]):
+            result['custody'].append({
+                'prop_no': prop, '財產名稱': b[name],
+                'before': f'{a[unit]} / {a[keeper]}', 'after': f'{b[unit]} / {b[keeper]}',
+            })
+        if prop in old_checked and prop not in new_checked:
+            result['missing'].append({'prop_no': prop, '財產名稱': b[name], '存置地點': b[place], '保管人': b[keeper]})
+    return [(key, label, columns, result[key]) for key, label, columns in COMPARE_CATEGORIES]
@@ -0,0 +1,119 @@
+"""
+Overdue-loan reminders.
+
+enqueue() finds every overdue open loan with one query on the partial
+em_log_open_date_apply index and writes one digest per borrower into the
+LoanReminder outbox (keyed by borrower and day, so reruns are no-ops).
+send_pending() delivers the outbox over a single mail connection and
+records each result, so failed messages are retried on the next run. A
+new day's enqueue() supersedes digests still pending from earlier days,
+so LOAN_REMINDER_MAX_ATTEMPTS caps the retries of one day's digest (when
+the command is run several times a day), not across days.
+"""
+
+import smtplib
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Log, LoanReminder
+
+LOAN_FIELDS = ['id', 'date_apply', 'user_id', 'user__name', 'user__email', 'user__role',
+               'equip__name', 'equip__model__name', 'equip__model__category']
+
+
+def threshold(category, role):
+    days = settings.LOAN_REMINDER_DAYS_BY_CATEGORY.get(category)
+    if days is None:
+        days = settings.LOAN_REMINDER_DAYS_BY_ROLE.get(role, settings.LOAN_REMINDER_DAYS)
+    return days
+
+
+def overdue_loans(today):
+    """{applicant_id: [loan rows]} of open loans past their threshold."""
+    shortest = min([settings.LOAN_REMINDER_DAYS, *settings.LOAN_REMINDER_DAYS_BY_CATEGORY.values(),
+                    *settings.LOAN_REMINDER_DAYS_BY_ROLE.values()])
+    loans = Log.objects.filter(date_return=None, date_apply__lte=today - timedelta(days=shortest))
+    result = defaultdict(list)
+    for row in loans.order_by('user_id', 'date_apply').values(*LOAN_FIELDS).iterator(chunk_size=2000):
+        row['days'] = (today - row['date_apply']).days
+        if row['days'] >= threshold(row['equip__model__category'], row['user__role']):
+            result[row['user_id']].append(row)
+    return result
+
+
+def enqueue(today):
+    """Queue today's digests; returns the number of new outbox rows."""
+    suffix = f':{today.isoformat()}'
+    # Older unsent digests may list loans returned since; today's replace them.
+    LoanReminder.objects.filter(status=0).exclude(key__endswith=suffix).update(
+        status=2, last_error='已由新的提醒取代')
+
+    reminders = []
+    for user_id, loans in overdue_loans(today).items():
+        if not loans[0]['user__email']:
+            continue
+        context = {'name': loans[0]['user__name'], 'loans': loans, 'today': today}
+        reminders.append(LoanReminder(
+            user_id=user_id,
+            key=f'{user_id}{suffix}',
+            email=loans[0]['user__email'],
+            subject=f'[設備借用] 您有 {len(loans)} 件設備逾期未歸還',
+            body=render_to_string('em/email/loan_reminder.txt', context),
+            loans=[row['id'] for row in loans],
+        ))
+    before = LoanReminder.objects.count()
+    LoanReminder.objects.bulk_create(reminders, batch_size=500, ignore_conflicts=True)
+    return LoanReminder.objects.count() - before
+
+
+def record_failure(reminder, error):
+    attempts = reminder.attempts + 1
+    LoanReminder.objects.filter(pk=reminder.pk).update(
+        attempts=attempts,
+        last_error=str(error) or error.__class__.__name__,
+        status=2 if attempts >= settings.LOAN_REMINDER_MAX_ATTEMPTS else 0,
+    )
+
+
+def send_pending(connection=None):
+    """Send every pending digest over one connection; returns (sent, failed)."""
+    pending = list(LoanReminder.objects.filter(status=0).order_by('id'))
+    if not pending:
+        return 0, 0
+    conn = connection or get_connection()
+    try:
+        conn.open()
+    except Exception as e:
+        for reminder in pending:
+            record_failure(reminder, e)
+        return 0, len(pending)
+
+    sent = failed = 0
+    try:
+        for reminder in pending:
+            message = EmailMessage(reminder.subject, reminder.body, to=[reminder.email], connection=conn)
+            try:
+                message.send()
+            except Exception as e:
+                failed += 1
+                record_failure(reminder, e)
+                if isinstance(e, smtplib.SMTPServerDisconnected):
+                    # The backend keeps the dead socket; start a new session
+                    # for the rest (a failed reopen surfaces on the next send).
+                    conn.close()
+                    try:
+                        conn.open()
+                    except Exception:
+                        pass
+            else:
+                sent += 1
+                LoanReminder.objects.filter(pk=reminder.pk).update(
+                    attempts=reminder.attempts + 1, status=1, sent=timezone.now(), last_error='')
+    finally:
+        conn.close()
+    return sent, failed
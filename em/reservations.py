@@ -0,0 +1,75 @@
+"""
+Reservation availability.
+
+Free units of a model on a day = lendable units - open loans - reserved
+units; a loan that picks up a reservation (Reservation.loans) counts only
+once. Loans and reservations overlapping the window are fetched with one
+grouped query each and turned into per-day counts with a difference array
+(a sweep over start/end events), so a month for every model costs three
+queries plus O(days + events) work, whatever the number of days.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Count, F, Sum
+
+from .models import Equip, Log, Reservation
+
+
+def daily_free(start, end, model_ids=None, exclude_reservation=None):
+    """Return {model_id: [free units on start, start+1, ..., end]}."""
+    days = (end - start).days + 1
+    equips = Equip.objects.filter(status=0, model__status=0)
+    loans = Log.objects.filter(date_return=None, date_apply__lte=end, equip__status=0, equip__model__status=0)
+    reservations = Reservation.objects.filter(date_end__gte=start, date_start__lte=end)
+    if model_ids is not None:
+        equips = equips.filter(model_id__in=model_ids)
+        loans = loans.filter(equip__model_id__in=model_ids)
+        reservations = reservations.filter(model_id__in=model_ids)
+    if exclude_reservation is not None:
+        reservations = reservations.exclude(id=exclude_reservation)
+
+    units = dict(equips.values('model_id').annotate(n=Count('id')).values_list('model_id', 'n'))
+    delta = defaultdict(lambda: [0] * (days + 1))
+    # An open loan occupies a unit from its lending date until it is returned.
+    for model_id, day, reserved_until, n in loans.values('equip__model_id', 'date_apply', 'reservations__date_end').annotate(
+            n=Count('id')).values_list('equip__model_id', 'date_apply', 'reservations__date_end', 'n'):
+        # A loan that picks up a reservation is already counted by it until the reservation ends.
+        if reserved_until is not None:
+            day = max(day, reserved_until + timedelta(days=1))
+            if day > end:
+                continue
+        delta[model_id][max((day - start).days, 0)] += n
+    for model_id, first, last, n in reservations.values('model_id', 'date_start', 'date_end').annotate(
+            n=Sum('quantity')).values_list('model_id', 'date_start', 'date_end', 'n'):
+        delta[model_id][max((first - start).days, 0)] += n
+        delta[model_id][min((last - start).days, days - 1) + 1] -= n
+
+    result = {}
+    for model_id in set(units) | set(delta) | set(model_ids or []):
+        total = units.get(model_id, 0)
+        busy = 0
+        free = []
+        for d in delta[model_id][:days]:
+            busy += d
+            free.append(total - busy)
+        result[model_id] = free
+    return result
+
+
+def free_units(model_id, start, end, exclude_reservation=None):
+    """Smallest number of free units of a model on any day of [start, end]."""
+    return min(daily_free(start, end, [model_id], exclude_reservation)[model_id])
+
+
+def matching_reservation(model_id, user_id, day):
+    """Id of the applicant's reservation of the model covering day that still has units to pick up."""
+    return (Reservation.objects
+            .filter(model_id=model_id, user_id=user_id, date_start__lte=day, date_end__gte=day)
+            .annotate(picked=Count('loans')).filter(picked__lt=F('quantity'))
+            .order_by('date_start', 'id').values_list('id', flat=True).first())
+
+
+def date_range(start, end):
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save
+
+from .models import Applicant, Equip, Inventory, InventoryValuation, Log, Model, Reservation, Tombstone
+from .reservations import matching_reservation
+
+FEED_MODELS = {
+    'model': Model,
+    'equip': Equip,
+    'applicant': Applicant,
+    'log': Log,
+}
+
+
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(entity=sender._meta.model_name, object_id=instance.pk)
+
+
+for model in FEED_MODELS.values():
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'tombstone_{model._meta.model_name}')
+
+
+def drop_valuation(sender, instance, **kwargs):
+    InventoryValuation.objects.filter(inventory=instance).delete()
+
+
+post_save.connect(drop_valuation, sender=Inventory, dispatch_uid='drop_inventory_valuation')
+
+
+def link_reservation(sender, instance, created, raw=False, **kwargs):
+    # Every lend path (forms, counter, admin) saves a Log; a new loan that
+    # picks up the borrower's reservation is tied to it.
+    if not created or raw or instance.date_return is not None:
+        return
+    reservation_id = matching_reservation(instance.equip.model_id, instance.user_id, instance.date_apply)
+    if reservation_id:
+        Reservation.loans.through.objects.create(reservation_id=reservation_id, log_id=instance.id)
+
+
+post_save.connect(link_reservation, sender=Log, dispatch_uid='link_loan_reservation')
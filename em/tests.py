@@ -1,3 +1,785 @@
-from django.test import TestCase
+import io
+import json
+import smtplib
+import sqlite3
+import tempfile
+import threading
+import warnings
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest import mock
+from urllib.parse import unquote
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from cc.routers import PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter
+from . import reminders, valuation
+from .admin import estimated_count
+from .api import ChangeFeed
+from .management.commands.profile_startup import BOOT_RSS_MB_BUDGET, BOOT_SECONDS_BUDGET, measure_startup
+from .management.commands.sqlite_to_postgres import Command as SQLiteToPostgres, copy_text
+from .models import *
+from .reconciliation import COLUMN_LABELS, compare_years, reconcile
+from .reservations import daily_free, free_units
+
+
+class SQLiteConcurrencyTest(TransactionTestCase):
+    serialized_rollback = True
+    WRITERS = 8
+    ROUNDS = 25
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        self.equip_ids = list(Equip.objects.values_list('id', flat=True)[:self.WRITERS])
+        self.log_ids = list(Log.objects.values_list('id', flat=True)[:self.WRITERS])
+
+    def test_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+    def test_parallel_writers(self):
+        errors = []
+        start = threading.Barrier(self.WRITERS)
+
+        def writer(n):
+            try:
+                start.wait()
+                for _ in range(self.ROUNDS):
+                    with transaction.atomic():
+                        InventoryLog.objects.create(equip_id=self.equip_ids[n], author_id=1)
+                        log = Log.objects.get(id=self.log_ids[n])
+                        log.date_return = date.today()
+                        log.save()
+            except OperationalError as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(self.WRITERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(InventoryLog.objects.count(), self.WRITERS * self.ROUNDS)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTest(SimpleTestCase):
+    def route(self, request, write=False):
+        router = ReplicaRouter()
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Equip))
+            seen.append(router.db_for_read(User))
+            if write:
+                router.db_for_write(Log)
+                seen.append(router.db_for_read(Equip))
+            return HttpResponse()
+
+        return ReplicaPinMiddleware(view)(request), seen
+
+    def test_browsing_reads_use_replica(self):
+        response, seen = self.route(RequestFactory().get('/em/model/'))
+        self.assertEqual(seen, ['replica1', 'default'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_to_primary(self):
+        response, seen = self.route(RequestFactory().get('/em/model/'), write=True)
+        self.assertEqual(seen, ['replica1', 'default', 'default'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = RequestFactory().get('/em/model/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertEqual(self.route(request)[1], ['default', 'default'])
+
+    def test_unsafe_methods_use_primary(self):
+        self.assertEqual(self.route(RequestFactory().post('/em/model/new/'))[1], ['default', 'default'])
+
+
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.get(pk=1))
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for name in ['log', 'equip', 'applicant', 'inventorylog', 'model', 'inventory']:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f'/admin/em/{name}/')
+            self.assertEqual(response.status_code, 200)
+            self.assertLess(len(queries), 10, name)
+
+    def test_autocomplete_search(self):
+        response = self.client.get('/admin/em/equip/autocomplete/', {'term': 'NB2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['results'])
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' | '.join(row[-1] for row in cursor.fetchall())
+
+    def test_search_uses_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite query plans')
+        request = RequestFactory().get('/admin/em/equip/', {'q': 'NB2'})
+        request.user = User.objects.get(pk=1)
+        for model in (Equip, Applicant, Log):
+            model_admin = admin.site._registry[model]
+            upper, lower = (model_admin.get_search_results(request, model_admin.get_queryset(request), term)[0]
+                            for term in ('NB2', 'nb2'))
+            self.assertNotRegex(self.query_plan(lower), rf'SCAN {model._meta.db_table}\b')
+            self.assertEqual(list(lower), list(upper))
+        equip = Equip.objects.exclude(barcode=None).first()
+        for term in (equip.name, equip.name.lower(), equip.barcode.lower()):
+            qs, distinct = admin.site._registry[Equip].get_search_results(request, Equip.objects.all(), term)
+            self.assertIn(equip, qs)
+        response = self.client.get('/admin/em/equip/autocomplete/', {'term': equip.name.lower()})
+        self.assertIn(str(equip.pk), [row['id'] for row in response.json()['results']])
+
+    def test_second_open_loan_is_rejected(self):
+        loan = Log.objects.filter(date_return=None).first()
+        response = self.client.post('/admin/em/log/add/', {
+            'equip': loan.equip_id, 'user': loan.user_id, 'date_apply': date.today().isoformat(), 'author': 1,
+        })
+        self.assertContains(response, OPEN_LOAN_ERROR)
+        self.assertEqual(Log.objects.filter(equip=loan.equip, date_return=None).count(), 1)
+
+    def test_estimated_count_ignores_partial_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite statistics')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimated_count(Log.objects.all()), Log.objects.count())
+
+
+class StartupBudgetTest(SimpleTestCase):
+    def test_worker_boot_within_budget(self):
+        for entry in ['cc.wsgi', 'cc.asgi']:
+            result = measure_startup(entry)
+            self.assertLess(result['seconds'], BOOT_SECONDS_BUDGET, entry)
+            self.assertLess(result['rss_kb'] / 1024, BOOT_RSS_MB_BUDGET, entry)
+            self.assertNotIn('pyexcel', result['modules'], entry)
+
+
+class ChangeFeedTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.get(pk=1))
+
+    def test_pages_cover_every_row_once(self):
+        seen = []
+        params = {'limit': 200}
+        while True:
+            data = self.client.get('/em/feed/equip/', params).json()
+            seen += [row['id'] for row in data['results']]
+            params.update(data['next'])
+            if not data['more']:
+                break
+        self.assertEqual(sorted(seen), sorted(Equip.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    @mock.patch.object(ChangeFeed, 'SAFETY_LAG', timedelta(0))
+    def test_deletions_are_reported(self):
+        cursor = self.client.get('/em/feed/log/', {'limit': 5000}).json()['next']
+        log = Log.objects.first()
+        log_id = log.id
+        log.delete()
+        data = self.client.get('/em/feed/log/', cursor).json()
+        self.assertEqual(data['results'], [])
+        self.assertEqual([t['id'] for t in data['deleted']], [log_id])
+
+    def test_unknown_entity(self):
+        self.assertEqual(self.client.get('/em/feed/si/').status_code, 404)
+
+    def test_bad_cursor(self):
+        for params in [{'since': 'yesterday'}, {'since': '2021-01-01T00:00:00+08:00,' + '9' * 25},
+                       {'deleted_after': '9' * 25}, {'limit': 'x'}]:
+            response = self.client.get('/em/feed/equip/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.json(), {'error': '參數格式錯誤'})
+
+    def test_negative_limit_is_clamped(self):
+        response = self.client.get('/em/feed/equip/', {'limit': -5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    @mock.patch.object(ChangeFeed, 'SAFETY_LAG', timedelta(0))
+    def test_reads_from_primary(self):
+        def replica_for_em(router, model, **hints):
+            return 'replica1' if model._meta.app_label == 'em' else None
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', replica_for_em):
+            response = self.client.get('/em/feed/equip/', {'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+
+class ApiTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.get(pk=1))
+
+    def test_projection_and_cursor(self):
+        data = self.client.get('/em/api/equip/', {'fields': 'name', 'limit': 10}).json()
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(set(data['results'][0]), {'id', 'name'})
+        page2 = self.client.get('/em/api/equip/', {'fields': 'name', 'limit': 10, 'after': data['next']}).json()
+        self.assertGreater(page2['results'][0]['id'], data['results'][-1]['id'])
+
+    def test_filters(self):
+        equip = Equip.objects.first()
+        data = self.client.get('/em/api/log/', {'equip': equip.id, 'limit': 1000}).json()
+        self.assertEqual(len(data['results']), equip.log_set.count())
+        self.assertEqual(self.client.get('/em/api/log/', {'equip': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/em/api/equip/', {'fields': 'password'}).status_code, 400)
+
+    def test_out_of_range_arguments(self):
+        for resource, params in [('equip', {'after': '9' * 25}), ('log', {'equip': '9' * 25}),
+                                 ('inventory', {'year': '9' * 15}), ('log', {'modified_after': '0001-01-01T00:00:00'})]:
+            response = self.client.get(f'/em/api/{resource}/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.json(), {'error': '參數格式錯誤'})
+
+    def test_naive_modified_after_is_local_time(self):
+        equip = Equip.objects.order_by('-modified').first()
+        stamp = timezone.localtime(equip.modified) - timedelta(seconds=1)
+        with warnings.catch_warnings():
+            # Django warns (RuntimeWarning) when a naive datetime reaches the query.
+            warnings.simplefilter('error', RuntimeWarning)
+            data = self.client.get('/em/api/equip/', {'modified_after': stamp.replace(tzinfo=None).isoformat(),
+                                                      'fields': 'id', 'limit': 1000}).json()
+        self.assertIn(equip.id, [row['id'] for row in data['results']])
+
+    def test_gzip(self):
+        response = self.client.get('/em/api/applicant/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class CounterTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.get(pk=1))
+        self.equip = Equip.objects.filter(status=0, model__status=0).exclude(log__date_return=None).first()
+        self.equip.barcode = 'T0001'
+        self.equip.save()
+        self.applicant = Applicant.objects.filter(status=0).first()
+
+    def scan(self, **data):
+        return self.client.post('/em/counter/scan/', data)
+
+    def test_lend_then_return(self):
+        self.assertContains(self.client.get('/em/counter/'), 'barcode')
+        response = self.scan(barcode='T0001', applicant=self.applicant.id)
+        self.assertEqual(response.json()['action'], 'lend')
+        self.assertTrue(Log.objects.filter(equip=self.equip, user=self.applicant, date_return=None).exists())
+
+        response = self.scan(barcode='T0001')
+        self.assertEqual(response.json()['action'], 'return')
+        self.assertFalse(Log.objects.filter(equip=self.equip, date_return=None).exists())
+
+    def test_unknown_barcode_and_missing_applicant(self):
+        self.assertEqual(self.scan(barcode='nope').status_code, 404)
+        self.assertEqual(self.scan(barcode='T0001').status_code, 400)
+        self.assertEqual(self.scan(barcode='   ', applicant=self.applicant.id).status_code, 400)
+
+    def test_duplicate_barcode_is_refused(self):
+        other = Equip.objects.exclude(id=self.equip.id).first()
+        other.barcode = 'T0001'
+        other.save()
+        open_loans = Log.objects.filter(date_return=None).count()
+        response = self.scan(barcode='T0001', applicant=self.applicant.id)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('條碼重複', response.json()['message'])
+        self.assertEqual(Log.objects.filter(date_return=None).count(), open_loans)
+
+    def test_applicant_lookup(self):
+        data = self.client.get('/em/counter/applicant/', {'q': self.applicant.name}).json()
+        self.assertIn(self.applicant.id, [row['id'] for row in data['results']])
+
+
+class ConcurrentLendTest(TransactionTestCase):
+    serialized_rollback = True
+    CLERKS = 8
+
+    def test_exactly_one_lend_wins(self):
+        equip = Equip.objects.exclude(log__date_return=None).first()
+        applicants = list(Applicant.objects.values_list('id', flat=True)[:self.CLERKS])
+        user = User.objects.get(pk=1)
+        start = threading.Barrier(self.CLERKS)
+        statuses, errors = [], []
+
+        def clerk(n):
+            try:
+                client = Client()
+                client.force_login(user)
+                start.wait()
+                response = client.post(f'/em/applicant/{applicants[n]}/new/', {
+                    'equip': equip.id, 'date_apply': date.today().isoformat(),
+                })
+                statuses.append(response.status_code)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=clerk, args=(n,)) for n in range(self.CLERKS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(statuses), [200] * (self.CLERKS - 1) + [302])
+        self.assertEqual(Log.objects.filter(equip=equip, date_return=None).count(), 1)
+
+
+class ReservationTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.get(pk=1))
+        self.model = Model.objects.filter(status=0).annotate(n=Count('equip')).filter(n__gte=3).first()
+        Log.objects.filter(equip__model=self.model, date_return=None).update(date_return=date(2020, 1, 1))
+        self.units = self.model.equip_set.filter(status=0).count()
+        self.applicant = Applicant.objects.filter(status=0).first()
+        self.day = date(2030, 5, 10)
+
+    def reserve(self, start, end, quantity=1):
+        return Reservation.objects.create(
+            model=self.model, user=self.applicant, quantity=quantity,
+            date_start=self.day + timedelta(days=start), date_end=self.day + timedelta(days=end),
+        )
+
+    def test_sweep_counts_overlaps(self):
+        self.reserve(0, 2, 2)
+        self.reserve(2, 4, 1)
+        equip = self.model.equip_set.filter(status=0).first()
+        other = Applicant.objects.filter(status=0).exclude(id=self.applicant.id).first()
+        Log.objects.create(equip=equip, user=other, date_apply=self.day + timedelta(days=3))
+        free = daily_free(self.day, self.day + timedelta(days=5), [self.model.id])[self.model.id]
+        u = self.units
+        self.assertEqual(free, [u - 2, u - 2, u - 3, u - 2, u - 2, u - 1])
+        self.assertEqual(free_units(self.model.id, self.day, self.day + timedelta(days=5)), u - 3)
+
+    def test_picked_up_reservation_counts_once(self):
+        reservation = self.reserve(0, 4, 1)
+        equip = self.model.equip_set.filter(status=0).first()
+        log = Log.objects.create(equip=equip, user=self.applicant, date_apply=self.day + timedelta(days=1))
+        self.assertEqual(list(log.reservations.all()), [reservation])
+        free = daily_free(self.day, self.day + timedelta(days=6), [self.model.id])[self.model.id]
+        self.assertEqual(free, [self.units - 1] * 7)
+        other = Applicant.objects.filter(status=0).exclude(id=self.applicant.id).first()
+        self.assertFalse(Log.objects.create(equip=self.model.equip_set.filter(status=0)[1], user=other,
+                                            date_apply=self.day).reservations.exists())
+
+    def test_overbooking_is_rejected(self):
+        self.reserve(0, 0, self.units)
+        url = f'/em/model/{self.model.id}/reserve/'
+        data = {'user': self.applicant.id, 'quantity': 1, 'date_start': self.day, 'date_end': self.day + timedelta(days=1)}
+        self.assertEqual(self.client.post(url, data).status_code, 200)
+        data['date_start'] = self.day + timedelta(days=1)
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+
+    def test_calendar_query_count_is_constant(self):
+        self.reserve(0, 2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/em/reservation/', {'month': '2030-05'})
+        self.assertContains(response, self.model.name)
+        self.assertLess(len(queries), 10)
+        data = self.client.get(f'/em/model/{self.model.id}/availability/', {'start': '2030-05-10', 'end': '2030-05-12'}).json()
+        self.assertEqual(data['free'], self.units - 1)
+
+    def test_unknown_model_and_zero_quantity(self):
+        missing = Model.objects.order_by('-id').first().id + 1
+        self.assertEqual(self.client.get(f'/em/model/{missing}/availability/').status_code, 404)
+        self.assertEqual(self.client.get(f'/em/model/{missing}/reserve/').status_code, 404)
+        data = {'user': self.applicant.id, 'quantity': 1, 'date_start': self.day, 'date_end': self.day}
+        self.assertEqual(self.client.post(f'/em/model/{missing}/reserve/', data).status_code, 404)
+        data['quantity'] = 0
+        response = self.client.post(f'/em/model/{self.model.id}/reserve/', data)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Reservation.objects.exists())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.reserve(0, 0, 0)
+
+
+class ProfilerTest(TestCase):
+    def test_staff_request_is_profiled(self):
+        self.client.force_login(User.objects.get(pk=1))
+        response = self.client.get('/em/model/', {'_profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        report = self.client.get(response['X-Profile-Url'])
+        self.assertContains(report, 'em_model')
+        self.assertContains(report, 'em/model_list.html')
+        self.assertContains(self.client.get('/em/model/', {'_profile': 'show'}), '函式 (cumulative)')
+
+    def test_not_enabled_for_regular_users(self):
+        user = User.objects.create_user('clerk', password='x')
+        self.client.force_login(user)
+        response = self.client.get('/', {'_profile': '1'})
+        self.assertNotIn('X-Profile-Url', response)
+        self.assertEqual(self.client.get('/profiles/').status_code, 302)
+
+
+class ReconciliationTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.get(pk=1))
+        self.year = date.today().year
+        self.equips = list(Equip.objects.filter(status=0, model__status=0).exclude(prop_no=None).order_by('id')[:4])
+        for n, e in enumerate(self.equips):
+            e.barcode = f'B{n}'
+            e.save()
+        self.equips[3].barcode = 'B0'
+        self.equips[3].save()
+        invlist = {e.prop_no: {'財產名稱': e.name} for e in self.equips[:3]}
+        invlist['NOPE-1'] = {'財產名稱': '幽靈設備'}
+        Inventory.objects.create(year=self.year, invlist=invlist)
+        InventoryLog.objects.create(equip=self.equips[0])
+        Log.objects.filter(equip=self.equips[0], date_return=None).delete()
+        Log.objects.create(equip=self.equips[0], user=Applicant.objects.first(), date_apply=date.today())
+
+    def test_categories(self):
+        with CaptureQueriesContext(connection) as queries:
+            report = {key: rows for key, label, columns, rows in reconcile(self.year)}
+        self.assertLessEqual(len(queries), 4)
+        self.assertEqual([r['prop_no'] for r in report['unmatched_register']], ['NOPE-1'])
+        self.assertIn(self.equips[3].id, [r['id'] for r in report['missing_from_register']])
+        self.assertLessEqual({self.equips[0].id, self.equips[3].id}, {r['id'] for r in report['duplicate_barcode']})
+        self.assertEqual([r['id'] for r in report['checked_on_loan']], [self.equips[0].id])
+        self.assertEqual({r['id'] for r in report['unchecked']}, {self.equips[1].id, self.equips[2].id})
+
+    def test_page_and_exports(self):
+        url = f'/em/inventory/{self.year}/reconcile/'
+        self.assertContains(self.client.get(url), '幽靈設備')
+        self.assertIn('幽靈設備', self.client.get(url, {'format': 'csv'}).content.decode('utf-8-sig'))
+        self.assertEqual(self.client.get(url, {'format': 'xlsx'}).status_code, 200)
+        self.assertEqual(self.client.get('/em/inventory/1999/reconcile/').status_code, 404)
+
+
+class InventoryCompareTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.get(pk=1))
+        Inventory.objects.create(year=2020, invlist={
+            'A-1': {'財產名稱': '筆電', '存置地點': 'R101', '保管單位': '資訊組', '保管人': '王'},
+            'A-2': {'財產名稱': '投影機', '存置地點': 'R102', '保管單位': '資訊組', '保管人': '王'},
+            'A-3': {'財產名稱': '印表機', '存置地點': 'R103', '保管單位': '資訊組', '保管人': '王'},
+        })
+        Inventory.objects.create(year=2021, invlist={
+            'A-1': {'財產名稱': '筆電', '存置地點': 'R201', '保管單位': '資訊組', '保管人': '王'},
+            'A-2': {'財產名稱': '投影機', '存置地點': 'R102', '保管單位': '教務處', '保管人': '李'},
+            'A-4': {'財產名稱': '平板', '存置地點': 'R104', '保管單位': '資訊組', '保管人': '王'},
+        })
+        equip = Equip.objects.exclude(prop_no=None).first()
+        equip.prop_no = 'A-2'
+        equip.save()
+        log = InventoryLog.objects.create(equip=equip)
+        InventoryLog.objects.filter(id=log.id).update(date_checked=timezone.make_aware(datetime(2020, 6, 1)))
+
+    def test_diff(self):
+        report = {key: rows for key, label, columns, rows in compare_years(2020, 2021)}
+        self.assertEqual([r['prop_no'] for r in report['added']], ['A-4'])
+        self.assertEqual([r['prop_no'] for r in report['disposed']], ['A-3'])
+        self.assertEqual([(r['before'], r['after']) for r in report['moved']], [('R101', 'R201')])
+        self.assertEqual([r['after'] for r in report['custody']], ['教務處 / 李'])
+        self.assertEqual([r['prop_no'] for r in report['missing']], ['A-2'])
+
+    def test_page_and_exports(self):
+        url = '/em/inventory/2021/compare/'
+        self.assertContains(self.client.get(url), '平板')
+        response = self.client.get(url, {'base': 2020, 'format': 'csv'})
+        self.assertIn('印表機', response.content.decode('utf-8-sig'))
+        self.assertIn('compare-2020-2021.csv', response['Content-Disposition'])
+        self.assertContains(self.client.get(url), '2020 → 2021 年清冊比較')
+        self.assertEqual(self.client.get('/em/inventory/2020/compare/').status_code, 404)
+
+    def test_reconcile_labels_untouched(self):
+        self.assertNotIn('before', COLUMN_LABELS)
+
+
+@override_settings(LOAN_REMINDER_DAYS=36500, LOAN_REMINDER_DAYS_BY_CATEGORY={}, LOAN_REMINDER_DAYS_BY_ROLE={})
+class LoanReminderTest(TestCase):
+    def setUp(self):
+        self.today = date(2030, 1, 1)
+        self.applicant = Applicant.objects.create(role=0, name='逾期測試', email='late@example.com', phone='0')
+        free = Equip.objects.exclude(log__date_return=None).select_related('model')[:3]
+        for n, equip in enumerate(free):
+            Log.objects.create(equip=equip, user=self.applicant, date_apply=self.today - timedelta(days=40 + n))
+        self.category = free[0].model.category
+
+    def test_digest_per_applicant(self):
+        with self.settings(LOAN_REMINDER_DAYS_BY_ROLE={self.applicant.role: 30}):
+            with CaptureQueriesContext(connection) as queries:
+                overdue = reminders.overdue_loans(self.today)
+            self.assertEqual(len(queries), 1)
+            self.assertEqual(len(overdue[self.applicant.id]), 3)
+            queued = reminders.enqueue(self.today)
+            self.assertEqual(queued, len(overdue))
+            self.assertEqual(reminders.enqueue(self.today), 0)
+
+        self.assertEqual(reminders.send_pending(), (queued, 0))
+        self.assertEqual(len(mail.outbox), queued)
+        digest = next(m for m in mail.outbox if m.to == [self.applicant.email])
+        self.assertIn('3 件', digest.subject)
+        self.assertEqual(reminders.send_pending(), (0, 0))
+
+    def test_category_threshold_overrides_role(self):
+        with self.settings(LOAN_REMINDER_DAYS_BY_ROLE={self.applicant.role: 1},
+                           LOAN_REMINDER_DAYS_BY_CATEGORY={self.category: 36500}):
+            loans = reminders.overdue_loans(self.today)[self.applicant.id]
+        self.assertTrue(all(row['equip__model__category'] != self.category for row in loans))
+
+    def test_failed_send_is_retried(self):
+        with self.settings(LOAN_REMINDER_DAYS=30):
+            reminders.enqueue(self.today)
+        with mock.patch.object(mail.EmailMessage, 'send', side_effect=OSError('down')):
+            self.assertEqual(reminders.send_pending()[1], LoanReminder.objects.count())
+        self.assertFalse(LoanReminder.objects.exclude(status=0, attempts=1, last_error='down').exists())
+        sent, failed = reminders.send_pending()
+        self.assertEqual((sent, failed), (LoanReminder.objects.filter(status=1).count(), 0))
+        self.assertEqual(len(mail.outbox), sent)
+
+
+class FlakySMTP(BaseEmailBackend):
+    def __init__(self, fail_open=False, drop_on=None):
+        super().__init__()
+        self.fail_open, self.drop_on = fail_open, drop_on
+        self.opens, self.alive, self.sent = 0, False, []
+
+    def open(self):
+        if self.fail_open:
+            raise ConnectionRefusedError('refused')
+        self.opens += 1
+        self.alive = True
+
+    def close(self):
+        self.alive = False
+
+    def send_messages(self, messages):
+        if not self.alive:
+            raise smtplib.SMTPServerDisconnected('not connected')
+        if len(self.sent) == self.drop_on:
+            self.drop_on, self.alive = None, False
+            raise smtplib.SMTPServerDisconnected('dropped')
+        self.sent += messages
+        return len(messages)
+
+
+class LoanReminderDeliveryTest(TestCase):
+    def setUp(self):
+        for applicant in Applicant.objects.order_by('id')[:4]:
+            LoanReminder.objects.create(user=applicant, key=f'{applicant.id}:2030-01-01', email='a@example.com',
+                                        subject='s', body='b', loans=[])
+
+    def test_connection_failure_is_recorded(self):
+        self.assertEqual(reminders.send_pending(FlakySMTP(fail_open=True)), (0, 4))
+        self.assertEqual(set(LoanReminder.objects.values_list('status', 'attempts', 'last_error')), {(0, 1, 'refused')})
+
+    def test_reconnects_after_disconnect(self):
+        backend = FlakySMTP(drop_on=1)
+        self.assertEqual(reminders.send_pending(backend), (3, 1))
+        self.assertEqual(backend.opens, 2)
+        self.assertEqual(LoanReminder.objects.filter(status=0, last_error='dropped').count(), 1)
+
+    @override_settings(LOAN_REMINDER_MAX_ATTEMPTS=2)
+    def test_gives_up_after_max_attempts(self):
+        reminders.send_pending(FlakySMTP(fail_open=True))
+        reminders.send_pending(FlakySMTP(fail_open=True))
+        self.assertEqual(set(LoanReminder.objects.values_list('status', flat=True)), {2})
+        self.assertEqual(reminders.send_pending(FlakySMTP()), (0, 0))
+
+
+class BookValueTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.get(pk=1))
+        self.equip = Equip.objects.exclude(prop_no=None).select_related('model').first()
+        self.inventory = Inventory.objects.create(year=2021, invlist={
+            self.equip.prop_no: {'財產名稱': '筆電', '保管單位': '資訊組', '帳面價值': '12,000',
+                                 '使用年限(月)': 60, '購置日期': '104/03/31', '可報廢日期': ''},
+            'X-1': {'財產名稱': '投影機', '保管單位': '教務處', '帳面價值': 30000,
+                    '使用年限(月)': '', '購置日期': '1090101', '可報廢日期': '2029-01-01'},
+        })
+
+    def test_parse_register_values(self):
+        self.assertEqual(valuation.register_date('110/05/01'), date(2021, 5, 1))
+        self.assertEqual(valuation.register_date('1100501'), date(2021, 5, 1))
+        self.assertEqual(valuation.register_date('2021-05-01'), date(2021, 5, 1))
+        self.assertIsNone(valuation.register_date('110/02/30'))
+        self.assertEqual(valuation.add_months(date(2015, 3, 31), 11), date(2016, 2, 29))
+
+    def test_report_and_cache(self):
+        report = {key: rows for key, label, columns, rows in valuation.report(2021, date(2028, 6, 1))}
+        self.assertEqual([(r['prop_no'], r['可報廢日期'], r['status']) for r in report['eligible']],
+                         [(self.equip.prop_no, '2020-03-31', self.equip.get_status_display())])
+        self.assertEqual([r['prop_no'] for r in report['upcoming']], ['X-1'])
+        self.assertEqual(report['by_unit'][-1], {'保管單位': '合計', '件數': 2, '帳面價值': 42000,
+                                                 '可報廢件數': 1, '可報廢帳面價值': 12000})
+        self.assertIn('無對應設備', [r['類別'] for r in report['by_category']])
+
+        with CaptureQueriesContext(connection) as queries:
+            valuation.report(2021, date(2028, 6, 1))
+        self.assertEqual(len(queries), 2)
+        self.inventory.save()
+        self.assertFalse(InventoryValuation.objects.exists())
+
+    def test_page_and_exports(self):
+        url = '/em/inventory/2021/book-value/'
+        self.assertContains(self.client.get(url), '筆電')
+        self.assertContains(self.client.get(url), '2021 年帳面價值與報廢評估')
+        self.assertIn('42000', self.client.get(url, {'format': 'csv'}).content.decode('utf-8-sig'))
+        self.assertEqual(self.client.get('/em/inventory/1999/book-value/').status_code, 404)
+
+
+class MediaServeTest(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        (self.root / 'model').mkdir()
+        (self.root / 'model' / 'JVC 數位攝影機.jpg').write_bytes(bytes(range(100)))
+        self.url = '/upload/model/JVC 數位攝影機.jpg'
+        override = override_settings(MEDIA_ROOT=self.root, MEDIA_SERVE_MODE='django')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def get(self, url=None, **headers):
+        response = self.client.get(url or self.url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_and_not_modified(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, bytes(range(100))))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        response, body = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual((response.status_code, body), (304, b''))
+
+    def test_ranges(self):
+        response, body = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual((response.status_code, body), (206, bytes(range(10, 20))))
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        response, body = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual((response.status_code, body), (206, bytes(range(95, 100))))
+        response, body = self.get(HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+        # Multiple ranges are not supported: the whole file is sent.
+        response, body = self.get(HTTP_RANGE='bytes=0-1,5-6')
+        self.assertEqual((response.status_code, len(body)), (200, 100))
+
+    def test_if_range_mismatch_sends_whole_file(self):
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, len(body)), (200, 100))
+        etag = response['ETag']
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, len(body)), (206, 10))
+
+    def test_path_traversal(self):
+        self.assertEqual(self.get('/upload/../manage.py')[0].status_code, 404)
+        self.assertEqual(self.get('/upload/%2e%2e/manage.py')[0].status_code, 404)
+        self.assertEqual(self.get('/upload/model/missing.jpg')[0].status_code, 404)
+
+    def test_offload_headers_are_ascii(self):
+        with self.settings(MEDIA_SERVE_MODE='x-accel-redirect', MEDIA_ACCEL_PREFIX='/protected-upload/'):
+            response, body = self.get()
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-upload/model/JVC%20%E6%95%B8%E4%BD%8D%E6%94%9D%E5%BD%B1%E6%A9%9F.jpg')
+        self.assertEqual(body, b'')
+        with self.settings(MEDIA_SERVE_MODE='x-sendfile'):
+            response, body = self.get()
+        self.assertEqual(unquote(response['X-Sendfile']), str(self.root / 'model' / 'JVC 數位攝影機.jpg'))
+        self.assertTrue(response['X-Sendfile'].isascii())
+
+
+class OptimizeStaticTest(SimpleTestCase):
+    FILES = {
+        'css/site.css': "body { background: url('../fonts/icons.ttf'); }" * 20,
+        'fonts/icons.ttf': 'font' * 100,
+        'js/unused.js': 'var unused = 1;' * 50,
+    }
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        base = Path(tmp.name)
+        source, self.root, templates = base / 'static', base / 'root', base / 'templates'
+        paths = {}
+        for name, content in self.FILES.items():
+            hashed = name.replace('.', '.abc123.', 1)
+            paths[name] = hashed
+            for directory, target in ((source, name), (self.root, name), (self.root, hashed)):
+                (directory / target).parent.mkdir(parents=True, exist_ok=True)
+                (directory / target).write_text(content)
+        for suffix in ('.gz', '.br'):
+            (self.root / (paths['js/unused.js'] + suffix)).write_bytes(b'old')
+        (self.root / 'staticfiles.json').write_text(json.dumps({'paths': paths, 'version': '1.0'}))
+        templates.mkdir()
+        (templates / 'page.html').write_text("{% load static %}<link href=\"{% static 'css/site.css' %}\">")
+        override = override_settings(
+            STATIC_ROOT=self.root,
+            STATICFILES_DIRS=[source],
+            TEMPLATES=[{'BACKEND': 'django.template.backends.django.DjangoTemplates',
+                        'DIRS': [templates], 'APP_DIRS': True}],
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def snapshot(self):
+        return sorted(str(p.relative_to(self.root)) for p in self.root.rglob('*') if p.is_file())
+
+    def test_dry_run_changes_nothing(self):
+        before = self.snapshot()
+        call_command('optimize_static', '--dry-run', stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_prunes_unused_and_keeps_css_fonts(self):
+        call_command('optimize_static', stdout=io.StringIO())
+        files = self.snapshot()
+        self.assertFalse([f for f in files if f.startswith('js/')])
+        for name in ('css/site.css', 'css/site.abc123.css', 'fonts/icons.ttf', 'fonts/icons.abc123.ttf'):
+            self.assertIn(name, files)
+        self.assertIn('css/site.abc123.css.gz', files)
+        manifest = json.loads((self.root / 'staticfiles.json').read_text())
+        self.assertEqual(set(manifest['paths']), {'css/site.css', 'fonts/icons.ttf'})
+
+
+class SQLiteToPostgresTest(TestCase):
+    def test_copy_text(self):
+        self.assertEqual(copy_text(None), '\\N')
+        self.assertEqual(copy_text('a\tb\nc\\d\re'), 'a\\tb\\nc\\\\d\\re')
+        self.assertEqual(copy_text(b'\x00\xff'), '\\\\x00ff')
+        self.assertEqual(copy_text(12), '12')
+        self.assertEqual(copy_text('數位攝影機'), '數位攝影機')
+
+    def test_verify(self):
+        source = sqlite3.connect(':memory:')
+        source.execute('CREATE TABLE em_si (id INTEGER PRIMARY KEY, name TEXT)')
+        source.executemany('INSERT INTO em_si VALUES (?, ?)', SI.objects.values_list('id', 'name'))
+        tables = [('em_si', ['id', 'name'])]
+        command = SQLiteToPostgres(stdout=io.StringIO())
+        self.assertTrue(command.verify(source, connection, tables))
+        source.execute('DELETE FROM em_si WHERE id = (SELECT MAX(id) FROM em_si)')
+        self.assertFalse(command.verify(source, connection, tables))
+        self.assertIn('em_si', command.stdout.getvalue())
+
+    def test_missing_or_empty_source(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            missing = Path(tmp) / 'typo.sqlite3'
+            with self.assertRaisesMessage(CommandError, '無法開啟'):
+                call_command('sqlite_to_postgres', source=str(missing))
+            self.assertFalse(missing.exists())
+            empty = Path(tmp) / 'empty.sqlite3'
+            sqlite3.connect(empty).close()
+            with self.assertRaisesMessage(CommandError, '沒有可搬移的資料表'):
+                call_command('sqlite_to_postgres', source=str(empty))
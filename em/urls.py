@@ -1,6 +1,7 @@
 from django.urls import path, reverse_lazy, re_path
 from django.views.generic import RedirectView
 from .views import *
+from .api import ApiList, ChangeFeed
 
 
 urlpatterns = [
@@ -33,8 +34,20 @@ urlpatterns = [
     path('inventory/new/', InventoryLogCreate.as_view(), name='inventory_log_create'),
     path('inventory/new/<int:eid>/', InventoryLogManualCreate.as_view(), name='inventory_log_manual_create'),
     path('inventory/<int:year>/', InventoryView.as_view(), name='inventory_view'),
+    path('inventory/<int:year>/reconcile/', InventoryReconcile.as_view(), name='inventory_reconcile'),
+    path('inventory/<int:year>/compare/', InventoryCompare.as_view(), name='inventory_compare'),
+    path('inventory/<int:year>/book-value/', InventoryBookValue.as_view(), name='inventory_book_value'),
     path('inventory/<int:year>/delete/<int:ilid>/', InventoryLogDelete.as_view(), name='inventory_log_delete'),
     path('inventory/import/', InventoryImport.as_view(), name='inventory_import'),
+    path('reservation/', ReservationCalendar.as_view(), name='reservation_calendar'),
+    path('reservation/<int:rid>/delete/', ReservationDelete.as_view(), name='reservation_delete'),
+    path('model/<int:mid>/reserve/', ReservationCreate.as_view(), name='reservation_create'),
+    path('model/<int:mid>/availability/', ModelAvailability.as_view(), name='model_availability'),
+    path('counter/', CounterView.as_view(), name='counter'),
+    path('counter/applicant/', CounterApplicantLookup.as_view(), name='counter_applicant'),
+    path('counter/scan/', CounterScan.as_view(), name='counter_scan'),
+    path('api/<str:resource>/', ApiList.as_view(), name='api_list'),
+    path('feed/<str:entity>/', ChangeFeed.as_view(), name='change_feed'),
     path('t/a/r/<int:rid>', TestApplicantListByRole.as_view()),
     re_path('t/a/fn/(?P<fn>.*)', TestApplicantListByFamilyName.as_view()),
     path('t/m/y/<int:year>', TestModelListByYearAfter.as_view()),
@@ -0,0 +1,130 @@
+"""
+Book value and scrap eligibility from the yearly register.
+
+The register keeps 帳面價值, 使用年限(月), 購置日期 and 可報廢日期 as text
+(dates usually in ROC years). columns() pulls just those fields out of
+Inventory.invlist, parses them column by column and stores the result in
+InventoryValuation, so each year is parsed once; re-importing a register
+drops only that year's cache. report() then joins the columns with the
+current Equip status in one query.
+"""
+
+import re
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, timedelta
+
+from .models import Equip, Inventory, InventoryValuation, Model
+from .reconciliation import register_fields
+
+VALUATION_FIELDS = ['財產名稱', '保管單位', '帳面價值', '使用年限(月)', '使用年限', '購置日期', '可報廢日期']
+
+CATEGORIES = [
+    ('eligible', '已達可報廢年限', ['prop_no', '財產名稱', '保管單位', '購置日期', '使用年限(月)', '可報廢日期', '帳面價值', 'status']),
+    ('upcoming', '一年內可報廢', ['prop_no', '財產名稱', '保管單位', '購置日期', '使用年限(月)', '可報廢日期', '帳面價值', 'status']),
+    ('by_category', '依設備類別', ['類別', '件數', '帳面價值', '可報廢件數', '可報廢帳面價值']),
+    ('by_unit', '依保管單位', ['保管單位', '件數', '帳面價值', '可報廢件數', '可報廢帳面價值']),
+]
+
+
+def register_date(value):
+    """Parse 110/05/01, 1100501, 110.5.1 (ROC years) or 2021-05-01; None if blank or invalid."""
+    text = str(value or '').strip()
+    if re.fullmatch(r'\d{6,8}', text):
+        parts = [text[:-4], text[-4:-2], text[-2:]]
+    else:
+        parts = re.split(r'[-/.]', text)
+    try:
+        year, month, day = (int(p) for p in parts)
+        return date(year + 1911 if year < 1911 else year, month, day)
+    except ValueError:
+        return None
+
+
+def register_number(value):
+    try:
+        number = float(str(value).replace(',', ''))
+    except ValueError:
+        return None
+    return int(number) if number.is_integer() else number
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, monthrange(year, month)[1]))
+
+
+def columns(year):
+    """Parsed register columns for one year, computed on first use and cached."""
+    cached = InventoryValuation.objects.filter(inventory__year=year).values_list('columns', flat=True).first()
+    if cached is not None:
+        return cached
+
+    register = register_fields(year, VALUATION_FIELDS)
+    props = sorted(register)
+    name, unit, value, life, life_old, bought, scrap = zip(*map(register.get, props)) if props else [()] * 7
+    bought = list(map(register_date, bought))
+    life = [register_number(a if a not in (None, '') else b) for a, b in zip(life, life_old)]
+    scrap = [
+        register_date(s) or (add_months(b, int(n)) if b and n else None)
+        for s, b, n in zip(scrap, bought, life)
+    ]
+    result = {
+        'prop_no': props,
+        '財產名稱': list(name),
+        '保管單位': [u or '' for u in unit],
+        '帳面價值': [register_number(v) or 0 for v in value],
+        '使用年限(月)': life,
+        # ISO strings compare in date order, so no re-parsing after the cache.
+        '購置日期': [d and d.isoformat() for d in bought],
+        '可報廢日期': [d and d.isoformat() for d in scrap],
+    }
+    InventoryValuation.objects.update_or_create(
+        inventory_id=Inventory.objects.values_list('id', flat=True).get(year=year),
+        defaults={'columns': result},
+    )
+    return result
+
+
+def report(year, today):
+    """Return [(key, label, columns, rows)] like reconciliation.reconcile()."""
+    cols = columns(year)
+    equips = {prop: (status, category) for prop, status, category in
+              Equip.objects.exclude(prop_no=None).values_list('prop_no', 'status', 'model__category')}
+    status_display = dict(Equip.STATUS_CHOICE)
+    category_display = dict(Model.CATEGORY_CHOICES)
+    today_iso, next_year_iso = today.isoformat(), (today + timedelta(days=365)).isoformat()
+
+    eligible, upcoming = [], []
+    by_category = defaultdict(lambda: [0, 0, 0, 0])
+    by_unit = defaultdict(lambda: [0, 0, 0, 0])
+    names = list(cols)
+    for values in zip(*cols.values()):
+        item = dict(zip(names, values))
+        status, category = equips.get(item['prop_no'], (None, None))
+        is_eligible = bool(item['可報廢日期']) and item['可報廢日期'] <= today_iso
+        if is_eligible:
+            eligible.append({**item, 'status': status_display.get(status, '無對應設備')})
+        elif item['可報廢日期'] and item['可報廢日期'] <= next_year_iso:
+            upcoming.append({**item, 'status': status_display.get(status, '無對應設備')})
+        for totals in (by_category[category_display.get(category, '無對應設備')], by_unit[item['保管單位']]):
+            totals[0] += 1
+            totals[1] += item['帳面價值']
+            if is_eligible:
+                totals[2] += 1
+                totals[3] += item['帳面價值']
+
+    def summary(key, groups):
+        rows = [{key: name, '件數': n, '帳面價值': v, '可報廢件數': en, '可報廢帳面價值': ev}
+                for name, (n, v, en, ev) in sorted(groups.items())]
+        rows.append({key: '合計', **{c: sum(r[c] for r in rows) for c in ('件數', '帳面價值', '可報廢件數', '可報廢帳面價值')}})
+        return rows
+
+    result = {
+        'eligible': sorted(eligible, key=lambda row: row['可報廢日期']),
+        'upcoming': sorted(upcoming, key=lambda row: row['可報廢日期']),
+        'by_category': summary('類別', by_category),
+        'by_unit': summary('保管單位', by_unit),
+    }
+    return [(key, label, columns, result[key]) for key, label, columns in CATEGORIES]
@@ -1,14 +1,18 @@
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, RedirectView, TemplateView, FormView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, RedirectView, TemplateView, FormView, View
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.db.models import Subquery, OuterRef, Prefetch, Count
+from django.shortcuts import get_object_or_404
 from django.urls import reverse_lazy
-from datetime import date
+from datetime import date, timedelta
 from .models import *
 from django import forms
 from django.contrib import messages
+from django.db import IntegrityError, transaction
 from datetime import date
-from django.http import HttpResponseRedirect
-import pyexcel
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, Http404
+from django.utils.dateparse import parse_date
+from .reservations import daily_free, free_units, date_range
+from . import reconciliation, valuation
 
 # Create your views here.
 class ModelList(PermissionRequiredMixin, ListView):
@@ -138,7 +142,18 @@ class ApplicantEdit(PermissionRequiredMixin, UpdateView):
     def get_success_url(self):
         return reverse_lazy('applicant_view', args=[self.object.id])
 
-class ApplicantLogCreate(PermissionRequiredMixin, CreateView):
+# 借出時違反 em_log_one_open_loan（同一設備已有未歸還紀錄）改以表單錯誤回應
+class SingleOpenLoanMixin:
+    def form_valid(self, form):
+        try:
+            with transaction.atomic():
+                return super().form_valid(form)
+        except IntegrityError:
+            form.add_error(None, OPEN_LOAN_ERROR)
+            return self.form_invalid(form)
+
+
+class ApplicantLogCreate(PermissionRequiredMixin, SingleOpenLoanMixin, CreateView):
     permission_required = 'em.add_log'
     model = Log
     fields = ['equip', 'date_apply']
@@ -179,7 +194,7 @@ class ApplicantLogCreate(PermissionRequiredMixin, CreateView):
         form.fields['equip'].widget.template_name = 'em/widgets/picker.html'
         return form
 
-class EquipLogCreate(PermissionRequiredMixin, CreateView):
+class EquipLogCreate(PermissionRequiredMixin, SingleOpenLoanMixin, CreateView):
     permission_required = 'em.add_log'
     model = Log
     fields = ['user', 'date_apply']
@@ -221,7 +236,7 @@ class LogReturn(PermissionRequiredMixin, UpdateView):
         form.instance.author = self.request.user
         return super().form_valid(form)
 
-class LogEdit(PermissionRequiredMixin, UpdateView):
+class LogEdit(PermissionRequiredMixin, SingleOpenLoanMixin, UpdateView):
     permission_required = 'em.change_log'
     model = Log
     pk_url_kwarg = 'lid'
@@ -415,17 +430,97 @@ class InventoryView(PermissionRequiredMixin, DetailView):
             applicant = Subquery(Log.objects.filter(date_return__isnull=True, equip_id=OuterRef('id')).values('user__name')[:1]),
             date_apply = Subquery(Log.objects.filter(date_return__isnull=True, equip_id=OuterRef('id')).values('date_apply')[:1]),
         )
-        for equip in equip_list:
+        for equip in equip_list.iterator(chunk_size=2000):
             if equip.prop_no in self.object.invlist:
                 self.object.invlist[equip.prop_no]["equip"] = equip
 
-        for inv in InventoryLog.objects.filter(date_checked__year=self.kwargs['year']).select_related('equip'):
+        for inv in InventoryLog.objects.filter(date_checked__year=self.kwargs['year']).select_related('equip').iterator(chunk_size=2000):
             self.object.invlist[inv.equip.prop_no]["result"] = inv
 
         ctx['inventory_list'] = self.object.invlist
         return ctx
 
 
+class InventoryReportMixin(PermissionRequiredMixin):
+    """Tabbed register report with csv / xlsx export; subclasses build the tables."""
+    permission_required = 'em.view_inventory'
+    template_name = 'em/inventory_report.html'
+    export_name = 'report'
+
+    def get_tables(self):
+        raise NotImplementedError
+
+    def get_filename(self, fmt):
+        return f'{self.export_name}-{self.kwargs["year"]}.{fmt}'
+
+    def get(self, request, *args, **kwargs):
+        try:
+            self.tables = self.get_tables()
+        except Inventory.DoesNotExist:
+            raise Http404('找不到該年度盤點清冊')
+        fmt = request.GET.get('format')
+        if fmt in ('csv', 'xlsx'):
+            content, content_type = reconciliation.export(self.tables, fmt)
+            response = HttpResponse(content, content_type=content_type)
+            response['Content-Disposition'] = f'attachment; filename="{self.get_filename(fmt)}"'
+            return response
+        return super().get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['year'] = self.kwargs['year']
+        ctx['tables'] = self.tables
+        return ctx
+
+
+class InventoryReconcile(InventoryReportMixin, TemplateView):
+    export_name = 'reconcile'
+
+    def get_tables(self):
+        return reconciliation.as_tables(reconciliation.reconcile(self.kwargs['year']))
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['title'] = f'{self.kwargs["year"]} 年盤點對帳'
+        return ctx
+
+
+class InventoryCompare(InventoryReportMixin, TemplateView):
+    export_name = 'compare'
+
+    def get_tables(self):
+        year = self.kwargs['year']
+        self.years = list(Inventory.objects.order_by('-year').values_list('year', flat=True))
+        try:
+            self.base = int(self.request.GET.get('base') or max(y for y in self.years if y < year))
+            report = reconciliation.compare_years(self.base, year)
+        except (ValueError, Inventory.DoesNotExist):
+            raise Http404('找不到可比較的盤點清冊')
+        return reconciliation.as_tables(report, reconciliation.COMPARE_LABELS)
+
+    def get_filename(self, fmt):
+        return f'compare-{self.base}-{self.kwargs["year"]}.{fmt}'
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['title'] = f'{self.base} → {self.kwargs["year"]} 年清冊比較'
+        ctx['base'] = self.base
+        ctx['years'] = [y for y in self.years if y != self.kwargs['year']]
+        return ctx
+
+
+class InventoryBookValue(InventoryReportMixin, TemplateView):
+    export_name = 'book-value'
+
+    def get_tables(self):
+        return reconciliation.as_tables(valuation.report(self.kwargs['year'], date.today()))
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['title'] = f'{self.kwargs["year"]} 年帳面價值與報廢評估'
+        return ctx
+
+
 class InventoryImport(PermissionRequiredMixin, CreateView):
     permission_required = 'em.add_inventoryevent'
     model = Inventory
@@ -450,17 +545,22 @@ class InventoryImport(PermissionRequiredMixin, CreateView):
         file = form.files['inv_file']
         ext = file.name.split(".")[-1]
         content = file.read()
+        # pyexcel pulls in lml plugin discovery and the xls/xlsx stacks; only
+        # this view needs it, so keep it out of worker start-up.
+        import pyexcel
         records = pyexcel.get_records(file_type=ext, file_content=content)
-        equip_list = [equip for equip in Equip.objects.exclude(prop_no__regex='^[0-9]{9}$').exclude(prop_no__isnull=True)]
+        equip_map = {}
+        for equip in Equip.objects.exclude(prop_no__regex='^[0-9]{9}$').exclude(prop_no__isnull=True).iterator(chunk_size=2000):
+            equip_map.setdefault(equip.prop_no, equip)
         inv_list = {}
         for rec in records:
             if rec['財產編號'] == '314010103':
-                equip = list(filter(lambda e: e.prop_no == rec['財產編號'] + '-' + rec['財產分號'], equip_list))
+                equip = equip_map.get(rec['財產編號'] + '-' + rec['財產分號'])
                 if equip:
-                    equip[0].prop_no = "{}-{}".format(rec['財產編號'], rec['財產分號'])
-                    equip[0].barcode = rec['條碼序號']
-                    equip[0].save()
-                    inv_list[equip[0].prop_no] = rec
+                    equip.prop_no = "{}-{}".format(rec['財產編號'], rec['財產分號'])
+                    equip.barcode = rec['條碼序號']
+                    equip.save()
+                    inv_list[equip.prop_no] = rec
                 else:
                     print("X: ", rec['財產分號'], rec['財產名稱'], rec['財產別名'], rec['廠牌'], rec['型式'], rec['購置日期'])
 
@@ -475,6 +575,161 @@ class InventoryImport(PermissionRequiredMixin, CreateView):
         form.instance.invlist = inv_list
         return super().form_valid(form)
 
+class CounterView(PermissionRequiredMixin, TemplateView):
+    permission_required = ('em.add_log', 'em.change_log')
+    template_name = 'em/counter.html'
+    extra_context = {'page_title': '借還櫃台'}
+
+
+class CounterApplicantLookup(PermissionRequiredMixin, View):
+    permission_required = ('em.add_log', 'em.change_log')
+
+    def get(self, request):
+        q = request.GET.get('q', '').strip()
+        if not q:
+            return JsonResponse({'results': []})
+        qs = Applicant.objects.filter(status=0)
+        if q.isdigit():
+            qs = qs.filter(id=int(q))
+        elif '@' in q:
+            qs = qs.filter(email=q)
+        else:
+            qs = qs.filter(name__startswith=q)
+        rows = list(qs.order_by('name').values('id', 'name', 'role')[:10])
+        for row in rows:
+            row['role'] = dict(Applicant.ROLE_CHOICES)[row['role']]
+        return JsonResponse({'results': rows}, json_dumps_params={'ensure_ascii': False})
+
+
+class CounterScan(PermissionRequiredMixin, View):
+    permission_required = ('em.add_log', 'em.change_log')
+
+    def result(self, ok, message, status=200, **extra):
+        return JsonResponse({'ok': ok, 'message': message, **extra}, status=status, json_dumps_params={'ensure_ascii': False})
+
+    def post(self, request):
+        barcode = request.POST.get('barcode', '').strip()
+        applicant_id = request.POST.get('applicant', '')
+        if not barcode:
+            return self.result(False, '請掃描設備條碼', status=400)
+        equips = list(Equip.objects.filter(barcode=barcode).select_related('model')[:2])
+        if not equips:
+            return self.result(False, f'找不到條碼 {barcode} 的設備', status=404)
+        if len(equips) > 1:
+            return self.result(False, f'條碼重複：{barcode} 對應多台設備，請至設備頁面處理', status=409)
+        equip = equips[0]
+
+        with transaction.atomic():
+            log = Log.objects.filter(equip=equip, date_return=None).select_related('user').first()
+            if log:
+                log.date_return = date.today()
+                log.author = request.user
+                log.save(update_fields=['date_return', 'author', 'modified'])
+                return self.result(True, f'{equip.name} 已由 {log.user.name} 歸還', action='return', equip=equip.name, log=log.id)
+
+            if not applicant_id.isdigit() or not Applicant.objects.filter(id=applicant_id, status=0).exists():
+                return self.result(False, '請先選擇借用人', status=400)
+            if equip.status != 0 or equip.model.status != 0:
+                return self.result(False, f'{equip.name} 目前狀態為「{equip.get_status_display()}」，不可借出', status=409)
+            try:
+                with transaction.atomic():
+                    log = Log.objects.create(equip=equip, user_id=applicant_id, date_apply=date.today(), author=request.user)
+            except IntegrityError:
+                return self.result(False, f'{equip.name} 剛被其他人借出，請重新掃描', status=409)
+        return self.result(True, f'{equip.name} 已借出', action='lend', equip=equip.name, log=log.id)
+
+class ReservationCalendar(PermissionRequiredMixin, TemplateView):
+    permission_required = 'em.view_reservation'
+    template_name = 'em/reservation_calendar.html'
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        try:
+            year, month = map(int, self.request.GET.get('month', '').split('-'))
+            first = date(year, month, 1)
+        except ValueError:
+            first = date.today().replace(day=1)
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        model_list = Model.objects.filter(status=0).order_by('category', 'name')
+        if self.request.GET.get('category', '').isdigit():
+            model_list = model_list.filter(category=self.request.GET['category'])
+        model_list = list(model_list)
+        free = daily_free(first, last, [m.id for m in model_list])
+        ctx.update({
+            'month': first,
+            'prev_month': (first - timedelta(days=1)).replace(day=1),
+            'next_month': last + timedelta(days=1),
+            'days': date_range(first, last),
+            'rows': [(m, free[m.id]) for m in model_list],
+            'model_category': Model.CATEGORY_CHOICES,
+            'reservation_list': Reservation.objects.filter(
+                date_end__gte=first, date_start__lte=last, model__in=model_list,
+            ).select_related('model', 'user').order_by('date_start'),
+        })
+        return ctx
+
+class ReservationCreate(PermissionRequiredMixin, CreateView):
+    permission_required = 'em.add_reservation'
+    model = Reservation
+    fields = ['user', 'quantity', 'date_start', 'date_end', 'memo']
+    template_name = 'em/model_form.html'
+    initial = {'date_start': date.today(), 'date_end': date.today()}
+
+    def get_success_url(self):
+        return reverse_lazy('reservation_calendar') + f'?month={self.object.date_start:%Y-%m}'
+
+    def get_form(self):
+        get_object_or_404(Model, id=self.kwargs['mid'])
+        form = super().get_form()
+        form.fields['user'].queryset = Applicant.objects.filter(status=0).order_by('role', 'name')
+        return form
+
+    def form_valid(self, form):
+        start, end = form.cleaned_data['date_start'], form.cleaned_data['date_end']
+        if end < start:
+            form.add_error('date_end', '結束日期不可早於開始日期')
+            return self.form_invalid(form)
+        with transaction.atomic():
+            # Lock the model row so concurrent bookings of it are checked one at a time.
+            model = get_object_or_404(Model.objects.select_for_update(), id=self.kwargs['mid'])
+            free = free_units(model.id, start, end)
+            if free < form.cleaned_data['quantity']:
+                form.add_error(None, f'{model.name} 在 {start} ~ {end} 期間最多只剩 {max(free, 0)} 台可預約')
+                return self.form_invalid(form)
+            form.instance.model = model
+            form.instance.author = self.request.user
+            return super().form_valid(form)
+
+class ReservationDelete(PermissionRequiredMixin, DeleteView):
+    permission_required = 'em.delete_reservation'
+    model = Reservation
+    pk_url_kwarg = 'rid'
+
+    def get_success_url(self):
+        return reverse_lazy('reservation_calendar') + f'?month={self.object.date_start:%Y-%m}'
+
+class ModelAvailability(PermissionRequiredMixin, View):
+    permission_required = 'em.view_reservation'
+
+    def get(self, request, mid):
+        if not Model.objects.filter(id=mid).exists():
+            raise Http404('找不到該型號')
+        try:
+            start = parse_date(request.GET.get('start') or date.today().isoformat())
+            end = parse_date(request.GET.get('end') or '') or start
+        except ValueError:
+            start = end = None
+        if start is None or end < start or (end - start).days > 366:
+            return JsonResponse({'error': '日期區間錯誤'}, status=400, json_dumps_params={'ensure_ascii': False})
+        daily = daily_free(start, end, [mid])[mid]
+        return JsonResponse({
+            'model': mid,
+            'start': start,
+            'end': end,
+            'free': min(daily),
+            'daily': dict(zip((d.isoformat() for d in date_range(start, end)), daily)),
+        })
+
 class TestApplicantListByRole(ListView):
     def get_queryset(self):
         return Applicant.objects.filter(role=self.kwargs['rid'])